@@ -2,15 +2,15 @@ import streamlit as st
 import os
 import shutil
 import time
-import fitz  # PyMuPDF
-from langchain_community.embeddings import DashScopeEmbeddings
-from paddleocr import PaddleOCR
 from dotenv import load_dotenv
 
-# 引入后端模块
-from src.parser.smart_parser import smart_extract
-from src.rag.vector_storage import build_vector_db
+# 引入后端模块 (重量级依赖都在第一次用到时才加载，见 src/utils/loaders.py)
+from src.ingest.job_queue import IngestService, ACTIVE_STATUSES, RETRYABLE_STATUSES, DONE
+from src.ingest.dedup import DedupLibrary, file_content_hash
 from src.llm.rag_chain import get_answer_stream
+from src.rag.reranker import get_reranker
+from src.ui.stream_renderer import StreamRenderer
+from src.utils.loaders import load_fitz, load_faiss_store, load_dashscope, start_background_warmup
 
 st.set_page_config(page_title="智能文档专家 (Ultimate)", page_icon="⚡", layout="wide")
 load_dotenv()
@@ -22,13 +22,23 @@ os.makedirs(DB_DATA_DIR, exist_ok=True)
 
 if 'uploader_key' not in st.session_state: st.session_state.uploader_key = 0
 
+# 后台解析服务：同时解析 3 个文档，OCR 同一时刻只允许 1 页 (OCR 最吃 CPU/内存)
 @st.cache_resource
-def load_ocr_engine():
-    return PaddleOCR(use_angle_cls=True, lang="ch")
+def get_ingest_service():
+    return IngestService(max_workers=3, ocr_workers=1, db_dir=DB_DATA_DIR)
 
-def render_pdf_page_as_image(pdf_path, human_page_num):
+# 去重库：重复上传的 PDF 直接指向已有索引 (与解析 worker 共享同一个 SQLite)
+@st.cache_resource
+def get_dedup_library():
+    return DedupLibrary()
+
+def resolve_db_path(clean_name):
+    return os.path.join(DB_DATA_DIR, get_dedup_library().resolve(clean_name))
+
+def render_pdf_page_as_image(pdf_path, human_page_num, highlight_texts=None):
     if not os.path.exists(pdf_path): return None
     try:
+        fitz = load_fitz()
         doc = fitz.open(pdf_path)
         try: page_index = int(human_page_num) - 1 
         except: page_index = 0
@@ -36,6 +46,14 @@ def render_pdf_page_as_image(pdf_path, human_page_num):
         if page_index >= len(doc): page_index = len(doc) - 1
         page = doc.load_page(page_index)
         
+        # 🖍️ 高亮被引用的原文片段 (逐行在文本层中定位；OCR 页没有文本层时自动跳过)
+        for text in highlight_texts or []:
+            for line in text.splitlines():
+                line = line.strip()
+                if len(line) < 4: continue
+                for rect in page.search_for(line):
+                    page.add_highlight_annot(rect)
+        
         # 🎨 【优化 1】降低渲染倍率：1.5倍足够清晰，且图片更小更轻量
         pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5)) 
         return pix.tobytes()
@@ -43,14 +61,18 @@ def render_pdf_page_as_image(pdf_path, human_page_num):
 
 def delete_project_completely(clean_filename):
     pdf_path = os.path.join(RAW_DATA_DIR, f"{clean_filename}.pdf")
-    db_path = os.path.join(DB_DATA_DIR, clean_filename)
+    library = get_dedup_library()
+    # 重复上传的文档只是别名：只删除别名和 PDF，不动被共享的索引
+    is_alias = library.is_alias(clean_filename)
+    db_path = resolve_db_path(clean_filename)
     if 'current_db' in st.session_state and st.session_state['current_db'] == db_path:
         del st.session_state['current_db']
     if 'last_selected' in st.session_state and st.session_state['last_selected'] == f"{clean_filename}.pdf":
         del st.session_state['last_selected']
-    if os.path.exists(db_path):
+    if not is_alias and os.path.exists(db_path):
         try: shutil.rmtree(db_path)
         except: return False
+    library.remove(clean_filename)
     if os.path.exists(pdf_path):
         try: os.remove(pdf_path)
         except: return False
@@ -116,19 +138,36 @@ with st.sidebar:
         
     st.divider()
     
-    uploaded_file = st.file_uploader("➕ 上传", type=["pdf"], key=f"uploader_{st.session_state.uploader_key}")
-    if uploaded_file:
-        file_name = uploaded_file.name
-        save_path = os.path.join(RAW_DATA_DIR, file_name)
-        if not os.path.exists(save_path):
-            with open(save_path, "wb") as f: f.write(uploaded_file.getbuffer())
-            st.toast(f"✅ {file_name} 入库")
+    uploaded_files = st.file_uploader("➕ 上传", type=["pdf"], accept_multiple_files=True, key=f"uploader_{st.session_state.uploader_key}")
+    if uploaded_files:
+        saved = []
+        for uploaded_file in uploaded_files:
+            file_name = uploaded_file.name
+            save_path = os.path.join(RAW_DATA_DIR, file_name)
+            if not os.path.exists(save_path):
+                with open(save_path, "wb") as f: f.write(uploaded_file.getbuffer())
+                saved.append(file_name)
+                # ♻️ 内容与已解析文档完全相同：直接复用已有索引，无需再解析
+                clean_name = os.path.splitext(file_name)[0].strip()
+                existing = get_dedup_library().find_document(file_content_hash(save_path))
+                if existing and existing['db_name'] != clean_name:
+                    get_dedup_library().add_alias(clean_name, existing['db_name'])
+                    st.toast(f"♻️ {file_name} 与「{existing['db_name']}」内容相同，已复用其索引")
+        if saved:
+            st.toast(f"✅ {', '.join(saved)} 入库")
             st.session_state.uploader_key += 1
             time.sleep(0.5)
             st.rerun()
     
     st.divider()
+    service = get_ingest_service()
     local_files = [f for f in os.listdir(RAW_DATA_DIR) if f.lower().endswith('.pdf')]
+    unparsed = [f for f in local_files
+                if not os.path.exists(os.path.join(resolve_db_path(os.path.splitext(f)[0].strip()), "index.faiss"))]
+    if unparsed and st.button(f"🚀 全部解析 ({len(unparsed)})"):
+        for f in unparsed:
+            service.submit(os.path.join(RAW_DATA_DIR, f), os.path.splitext(f)[0].strip())
+        st.rerun()
     if local_files:
         idx = 0
         if 'last_selected' in st.session_state and st.session_state['last_selected'] in local_files:
@@ -139,7 +178,7 @@ with st.sidebar:
         if selected_file:
             clean_name = os.path.splitext(selected_file)[0].strip()
             pdf_path = os.path.join(RAW_DATA_DIR, selected_file)
-            db_path = os.path.join(DB_DATA_DIR, clean_name)
+            db_path = resolve_db_path(clean_name)
             st.session_state['current_pdf_path'] = pdf_path
             st.session_state['current_db'] = db_path
             
@@ -148,18 +187,57 @@ with st.sidebar:
                 if st.button("🗑️ 删除"):
                     if delete_project_completely(clean_name):
                         st.rerun()
+            elif service.active_job_for(clean_name):
+                st.info("⏳ 解析中，进度见下方任务列表")
             else:
                 st.warning("⚠️ 未解析")
                 if st.button("🚀 解析"):
-                    with st.spinner("解析中..."):
-                        try:
-                            ocr = load_ocr_engine()
-                            embed = DashScopeEmbeddings(model="text-embedding-v1")
-                            raw = smart_extract(pdf_path, ocr)
-                            build_vector_db(raw, clean_name, embed)
-                            st.success("完成")
-                            st.rerun()
-                        except Exception as e: st.error(str(e))
+                    service.submit(pdf_path, clean_name)
+                    st.rerun()
+
+    # 任务面板：以 fragment 形式每 2 秒局部刷新，只读取任务状态，不阻塞页面
+    @st.fragment(run_every=2)
+    def render_ingest_jobs():
+        jobs = service.list_jobs()
+        if not jobs: return
+        st.divider()
+        st.subheader("🛠️ 解析任务")
+        if 'done_jobs' not in st.session_state:
+            st.session_state.done_jobs = {j['job_id'] for j in jobs if j['status'] == DONE}
+        seen_done = st.session_state.done_jobs
+        for job in jobs:
+            name, status = job['db_name'], job['status']
+            total = job['pages_total'] or 0
+            if status in ACTIVE_STATUSES:
+                label = "取消中" if job['cancel_requested'] else job['stage']
+                st.caption(f"⏳ {name} · {label} ({job['pages_done']}/{total or '?'} 页)")
+                st.progress(job['pages_done'] / total if total else 0.0)
+                if not job['cancel_requested'] and st.button("✖️ 取消", key=f"cancel_{job['job_id']}"):
+                    service.cancel(job['job_id'])
+            elif status == DONE:
+                st.caption(f"✅ {name} · {job['stage']}")
+                dedup = job.get('dedup')
+                if dedup and dedup.get('duplicate_of'):
+                    st.caption(f"♻️ 与「{dedup['duplicate_of']}」内容相同，复用其索引")
+                elif dedup:
+                    # 只有复用的 OCR 结果和向量算作节省；文本页的近似重复只是检测到，仍按本页文本重新解析
+                    if dedup['ocr_pages_saved'] or dedup['embeddings_reused']:
+                        st.caption(f"♻️ 省下 {dedup['ocr_pages_saved']} 次 OCR / {dedup['embeddings_reused']} 次向量化")
+                    if dedup['near_duplicate_pages']:
+                        st.caption(f"🔍 检测到 {dedup['near_duplicate_pages']} 页与已有文档近似重复")
+                # 任务刚完成时整页重跑一次，刷新书架上的“已解析”状态
+                if job['job_id'] not in seen_done:
+                    seen_done.add(job['job_id'])
+                    st.rerun()
+            elif status in RETRYABLE_STATUSES:
+                st.caption(f"{'🚫' if status == 'cancelled' else '❌'} {name} · {job['stage']}"
+                           + (f": {job['error']}" if job.get('error') else ""))
+                if st.button("🔁 重试", key=f"retry_{job['job_id']}"):
+                    service.retry(job['job_id'])
+        if st.button("🧹 清除已结束任务"):
+            service.clear_finished()
+
+    render_ingest_jobs()
 
 # ================= 主界面 =================
 st.title("⚡ PDF智能文档专家")
@@ -181,18 +259,21 @@ if prompt := st.chat_input("提问..."):
 
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        full_response = ""
-        embed = DashScopeEmbeddings(model="text-embedding-v1")
         
         try:
-            response_stream, source_docs = get_answer_stream(prompt, current_db, st.session_state.messages, embed)
+            # embedding_model 留空：使用进程内共享的 EmbeddingClient
+            response_stream, source_docs = get_answer_stream(prompt, current_db, st.session_state.messages)
             
-            for chunk in response_stream:
-                if chunk.status_code == 200:
-                    content = chunk.output.choices[0].message.content
-                    full_response += content
-                    placeholder.markdown(full_response + "▌")
-            placeholder.markdown(full_response)
+            # 节流渲染：按帧率/Markdown 块边界刷新，而不是每个 token 重绘全文
+            # consume 在 LLM 停顿时也会按帧把已收到的内容刷出来
+            renderer = StreamRenderer(placeholder)
+            full_response = renderer.consume(
+                response_stream,
+                lambda chunk: chunk.output.choices[0].message.content if chunk.status_code == 200 else None,
+            )
+            stats = renderer.stats
+            print(f"🖌️ [Stream] {stats['tokens']} tokens -> {stats['renders']} 次渲染, "
+                  f"首屏 {stats['time_to_first_paint'] * 1000:.0f} ms, 总计 {stats['elapsed']:.2f} s")
             st.session_state.messages.append({"role": "assistant", "content": full_response})
 
             if source_docs:
@@ -210,10 +291,16 @@ if prompt := st.chat_input("提问..."):
                     # 将图片分配到左右两列
                     with cols[idx % 2]:
                         with st.expander(f"📄 第 {page_num} 页原文快照", expanded=True):
-                            relevant_text = next((d.page_content for d in source_docs if d.metadata.get('human_page_number') == page_num), "...")
-                            st.caption(f"相关内容摘录: ...{relevant_text[:100]}...")
+                            page_docs = [d for d in source_docs if d.metadata.get('human_page_number') == page_num]
+                            for d in page_docs:
+                                start, end = d.metadata.get('char_start'), d.metadata.get('char_end')
+                                if start is not None and end is not None:
+                                    st.caption(f"引用片段 (第 {page_num} 页, 字符 {start}-{end}):")
+                                else:
+                                    st.caption("引用片段:")
+                                st.markdown("\n".join(f"> {line}" for line in d.page_content.splitlines() if line.strip()))
                             if current_pdf and os.path.exists(current_pdf):
-                                img_bytes = render_pdf_page_as_image(current_pdf, page_num)
+                                img_bytes = render_pdf_page_as_image(current_pdf, page_num, [d.page_content for d in page_docs])
                                 # use_column_width=True 配合 columns(2) 会自动缩小图片
                                 if img_bytes: st.image(img_bytes, use_column_width=True)
             
@@ -236,4 +323,11 @@ if prompt := st.chat_input("提问..."):
         except Exception as e:
             st.error(f"Error: {e}")
             import traceback
-            st.code(traceback.format_exc())
\ No newline at end of file
+            st.code(traceback.format_exc())
+
+# ================= 后台预热 =================
+# 首屏已经渲染完，再在后台加载聊天链路依赖、Reranker 和一个 worker 的 OCR 模型
+# 设置环境变量 PDF_RAG_WARMUP=0 可关闭
+if os.getenv("PDF_RAG_WARMUP", "1") != "0":
+    start_background_warmup(load_faiss_store, load_dashscope, get_reranker,
+                            get_ingest_service().warmup_ocr)
@@ -0,0 +1,126 @@
+"""
+批量问答基准测试：对比逐题执行同一条流水线 (单条 query 向量化 / 各索引检索合并取前 k / 单独重排 / 一次生成)
+与 run_bulk_qa (批量向量化 + 批量 FAISS 检索 + 共享批次重排 + 并发生成)，统计 题/分钟
+两边每题做的工作相同：k 个候选重排、一次 LLM 调用；索引都只加载一次
+
+完全离线：
+- Embedding 走 bench_embedding 的本地 mock 服务 (注入网络延迟)
+- Reranker 用 bench_reranker 生成的随机小模型 (int8 后端)
+- LLM 用固定耗时的假生成函数
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.bench_bulk_qa --questions 100 --indexes 2
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from benchmarks.bench_embedding import make_handler
+from benchmarks.bench_reranker import CORPUS, build_tiny_model
+
+
+def fake_generate(latency):
+    def generate(messages):
+        time.sleep(latency)
+        return f"(假回答) {messages[-1]['content']}"
+    return generate
+
+
+def build_indexes(tmp, embeddings, n_indexes, chunks_per_index):
+    from src.rag.vector_storage import save_faiss_index
+    from src.utils.loaders import load_document_class, load_faiss_store
+
+    Document, FAISS = load_document_class(), load_faiss_store()
+    rng = random.Random(0)
+    chars = CORPUS.replace(" ", "")
+    db_paths = {}
+    for n in range(n_indexes):
+        docs = [Document(page_content="".join(rng.choice(chars) for _ in range(300)),
+                         metadata={"source_page": i // 5 + 1}) for i in range(chunks_per_index)]
+        path = os.path.join(tmp, f"manual_{n}")
+        save_faiss_index(FAISS.from_documents(docs, embeddings), path)
+        db_paths[f"manual_{n}"] = path
+    return db_paths
+
+
+def run_sequential(questions, db_paths, embeddings, generate, output_path, k=20, top_k=10):
+    """基线：一次只处理一个问题，各索引检索结果按距离合并取前 k 个 -> 重排 -> 一次生成"""
+    import json
+    from src.llm.rag_chain import load_vectorstore, normalize_page_numbers, build_messages
+    from src.rag.reranker import rerank_documents
+
+    start = time.perf_counter()
+    vectorstores = [load_vectorstore(path, embeddings) for path in db_paths.values()]
+    with open(output_path, "w", encoding="utf-8") as out:
+        for q in questions:
+            query_vector = embeddings.embed_query(q["question"])
+            hits = []
+            for vectorstore in vectorstores:
+                hits += vectorstore.similarity_search_with_score_by_vector(query_vector, k=k)
+            candidates = [doc for doc, _ in sorted(hits, key=lambda x: x[1])[:k]]
+            docs = normalize_page_numbers(rerank_documents(q["question"], candidates, top_k=top_k))
+            answer = generate(build_messages(q["question"], docs))
+            out.write(json.dumps({"id": q["id"], "answer": answer}, ensure_ascii=False) + "\n")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--indexes", type=int, default=2)
+    parser.add_argument("--chunks", type=int, default=2000, help="每个索引的切片数")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="mock Embedding 接口每次请求的延迟 (秒)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="假 LLM 每次生成的耗时 (秒)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sequential-sample", type=int, default=10,
+                        help="逐个调用的基线只跑前 N 个问题，再按比例换算 题/分钟")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Reranker 必须在第一次 get_reranker() 之前配置好
+        os.environ["RERANKER_BACKEND"] = "int8"
+        os.environ["RERANKER_MODEL"] = build_tiny_model(tmp)
+        os.environ["RERANKER_MAX_LENGTH"] = "256"
+
+        from src.llm.bulk_qa import run_bulk_qa
+        from src.rag.embedding_client import EmbeddingClient
+        from src.rag.reranker import get_reranker
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.embed_latency, 0.0005, 0.0, 256))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        embeddings = EmbeddingClient(model="mock", api_key="mock",
+                                     base_url=f"http://127.0.0.1:{server.server_port}/embeddings",
+                                     max_concurrency=8, requests_per_second=200)
+
+        db_paths = build_indexes(tmp, embeddings, args.indexes, args.chunks)
+        get_reranker()
+        rng = random.Random(1)
+        chars = CORPUS.replace(" ", "")
+        questions = [{"id": i, "question": "".join(rng.choice(chars) for _ in range(20))}
+                     for i in range(args.questions)]
+        generate = fake_generate(args.llm_latency)
+        print(f"🧪 {args.questions} 个问题 x {args.indexes} 个索引 (每个 {args.chunks} 个切片), "
+              f"Embedding 延迟 {args.embed_latency}s, LLM 延迟 {args.llm_latency}s, 并发 {args.concurrency}\n")
+
+        sample = questions[:args.sequential_sample]
+        seq_elapsed = run_sequential(sample, db_paths, embeddings, generate, os.path.join(tmp, "seq.jsonl"))
+        seq_qpm = len(sample) / seq_elapsed * 60
+
+        stats = run_bulk_qa(questions, db_paths, os.path.join(tmp, "bulk.jsonl"), embedding_model=embeddings,
+                            max_concurrency=args.concurrency, generate_fn=generate)
+
+        print(f"\n{'方式':<22} {'题/分钟':>10}")
+        print(f"{'逐个调用 (前 %d 题)' % len(sample):<20} {seq_qpm:>10.1f}")
+        print(f"{'run_bulk_qa':<22} {stats['questions_per_minute']:>10.1f}")
+        print(f"\n🚀 加速比: {stats['questions_per_minute'] / seq_qpm:.1f}x")
+
+        embeddings.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Embedding 客户端基准测试：本地 mock 服务 (注入延迟 + 随机 429) 上对比
+    baseline : 每批一个新连接、串行请求 (等价于原来的 DashScopeEmbeddings 用法)
+    client   : EmbeddingClient (连接池 + 并发分批 + 令牌桶限流 + 重试)
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.bench_embedding --texts 2000 --latency 0.08 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.rag.embedding_client import EmbeddingClient, DEFAULT_BATCH_SIZE
+
+
+def make_handler(latency, per_text_latency, error_rate, dim):
+    class MockEmbeddingHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            texts = json.loads(body)["input"]["texts"]
+            time.sleep(latency + per_text_latency * len(texts))
+
+            if random.random() < error_rate:
+                payload = b'{"code": "Throttling"}'
+                self.send_response(429)
+            else:
+                payload = json.dumps({"output": {"embeddings": [
+                    {"text_index": i, "embedding": [random.random() for _ in range(dim)]}
+                    for i in range(len(texts))
+                ]}}).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return MockEmbeddingHandler
+
+
+def baseline_embed(url, texts):
+    """串行、每次新建连接、无重试 (遇到 429 简单地原地重发)"""
+    vectors = []
+    for i in range(0, len(texts), DEFAULT_BATCH_SIZE):
+        batch = texts[i:i + DEFAULT_BATCH_SIZE]
+        while True:
+            resp = requests.post(url, json={"model": "mock", "input": {"texts": batch}},
+                                 headers={"Connection": "close"})
+            if resp.status_code == 200:
+                vectors.extend(e["embedding"] for e in resp.json()["output"]["embeddings"])
+                break
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.08, help="每个请求的固定延迟 (秒)")
+    parser.add_argument("--per-text-latency", type=float, default=0.001)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="随机返回 429 的概率")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=50)
+    args = parser.parse_args()
+
+    handler = make_handler(args.latency, args.per_text_latency, args.error_rate, args.dim)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/embeddings"
+
+    texts = [f"第 {i} 段测试文本，用于评估向量化吞吐。" for i in range(args.texts)]
+    print(f"📦 {len(texts)} 条文本, batch={DEFAULT_BATCH_SIZE}, 延迟={args.latency}s, 429 概率={args.error_rate}\n")
+
+    start = time.perf_counter()
+    base_vectors = baseline_embed(url, texts)
+    base_elapsed = time.perf_counter() - start
+    print(f"baseline (串行/无连接复用)  {base_elapsed:>7.2f} s  {len(texts) / base_elapsed:>8.1f} 条/秒")
+
+    client = EmbeddingClient(model="mock", api_key="mock", base_url=url,
+                             max_concurrency=args.concurrency, requests_per_second=args.rps,
+                             backoff_base=0.05)
+    start = time.perf_counter()
+    vectors = client.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    print(f"EmbeddingClient             {elapsed:>7.2f} s  {len(texts) / elapsed:>8.1f} 条/秒")
+    print(f"   请求数={client.stats['requests']}  重试={client.stats['retries']}")
+
+    assert len(vectors) == len(base_vectors) == len(texts)
+    print(f"\n🚀 加速比: {base_elapsed / elapsed:.2f}x")
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Reranker 基准测试：对比当前路径 (FlagReranker，每个请求单独计算 20 个 pair) 与
+int8 量化后端 + 跨请求微批调度，统计 pairs/sec 和单请求延迟
+
+默认在临时目录里生成一个随机初始化的小型 BERT 交叉编码器，完全离线；
+也可以用 --model 指定真实模型 (如本地的 bge-reranker-base) 得到真实数据
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.bench_reranker --clients 8 --requests 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from src.rag.reranker import BatchedReranker, Int8CpuReranker, LockedReranker
+from src.utils.loaders import load_flag_reranker, load_torch, load_transformers
+
+CORPUS = (
+    "深度学习模型在铁路故障诊断中表现出良好的泛化能力。实验结果表明所提方法的准确率明显提升。"
+    "该系统由数据层检索层和生成层组成各层之间通过标准接口通信。我们在附录中给出了完整的超参数设置。"
+    "the proposed retriever outperforms bm25 on all benchmarks and reduces latency"
+)
+
+
+def build_tiny_model(path, hidden=256, layers=4):
+    """生成一个随机初始化的小型 BERT 交叉编码器 (只用于测速，分数没有意义)"""
+    torch = load_torch()
+    transformers = load_transformers()
+    torch.manual_seed(0)
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += sorted(set(CORPUS.replace(" ", "")) | set(CORPUS.split()))
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+
+    config = transformers.BertConfig(
+        vocab_size=len(vocab), hidden_size=hidden, num_hidden_layers=layers,
+        num_attention_heads=4, intermediate_size=hidden * 4, max_position_embeddings=512, num_labels=1,
+    )
+    transformers.BertForSequenceClassification(config).save_pretrained(path)
+    transformers.BertTokenizer(vocab_file).save_pretrained(path)
+    return path
+
+
+def make_requests(n, pairs_per_request, passage_chars, seed=0):
+    rng = random.Random(seed)
+    chars = CORPUS.replace(" ", "")
+    requests = []
+    for _ in range(n):
+        query = "".join(rng.choice(chars) for _ in range(16))
+        requests.append([
+            [query, "".join(rng.choice(chars) for _ in range(rng.randint(passage_chars // 2, passage_chars)))]
+            for _ in range(pairs_per_request)
+        ])
+    return requests
+
+
+def run(name, scorer, requests, clients):
+    # 预热一次，排除首次调用的初始化开销
+    scorer.compute_score(requests[0])
+
+    latencies = []
+    done_pairs = 0
+    errors = []
+    lock = threading.Lock()
+    it = iter(requests)
+
+    def client():
+        nonlocal done_pairs
+        while True:
+            with lock:
+                pairs = next(it, None)
+            if pairs is None:
+                return
+            start = time.perf_counter()
+            try:
+                scorer.compute_score(pairs)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000)
+                done_pairs += len(pairs)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    # 只统计成功完成的请求，失败的请求单独报告
+    if not latencies:
+        print(f"{name:<28} {'-':>10} {'-':>10} {'-':>10} {len(errors):>6}  ({errors[0]!r})")
+        return
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    note = f"  ({errors[0]!r})" if errors else ""
+    print(f"{name:<28} {done_pairs / elapsed:>10.1f} {statistics.median(latencies):>10.1f} {p95:>10.1f}"
+          f" {len(errors):>6}{note}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None, help="模型名或本地路径；不填则生成离线小模型")
+    parser.add_argument("--clients", type=int, default=8, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=10, help="每个并发客户端的请求数")
+    parser.add_argument("--pairs", type=int, default=20, help="每个请求的 (问题, 文档) 对数")
+    parser.add_argument("--passage-chars", type=int, default=400)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--batch-wait-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=128)
+    args = parser.parse_args()
+
+    tmp = None
+    model = args.model
+    if model is None:
+        tmp = tempfile.TemporaryDirectory()
+        model = build_tiny_model(tmp.name)
+
+    requests = make_requests(args.clients * args.requests, args.pairs, args.passage_chars)
+    print(f"🧪 模型: {args.model or '离线小型 BERT'}; {args.clients} 个并发客户端 x {args.requests} 个请求, "
+          f"每个请求 {args.pairs} 对, max_length={args.max_length}\n")
+    print(f"{'后端':<26} {'pairs/s':>10} {'p50(ms)':>10} {'p95(ms)':>10} {'失败':>5}")
+
+    FlagReranker = load_flag_reranker()
+    # 与 get_reranker() 一致：模型调用用锁串行化 (FlagReranker 的 tokenizer 不能被多线程同时使用)
+    flag = LockedReranker(FlagReranker(model, use_fp16=True, max_length=args.max_length, devices="cpu"))
+    run("flag (当前路径)", flag, requests, args.clients)
+    run("flag + 微批", BatchedReranker(flag, args.max_batch, args.batch_wait_ms), requests, args.clients)
+
+    int8 = Int8CpuReranker(model, max_length=args.max_length)
+    run("int8", int8, requests, args.clients)
+    run("int8 + 微批", BatchedReranker(int8, args.max_batch, args.batch_wait_ms), requests, args.clients)
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
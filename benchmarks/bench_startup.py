@@ -0,0 +1,170 @@
+"""
+启动耗时基准 / 回归检查：用 python -X importtime 测量 app.py 及各个 src 模块的导入耗时，
+并检查导入时是否拉进了重量级依赖 (paddleocr、FlagEmbedding、torch、cv2、fitz 等)
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.bench_startup                   # 与 importtime_baseline.json 对比，回归时退出码为 1
+    python -m benchmarks.bench_startup --write-baseline  # 重新生成基线
+
+回归检查分两部分：
+- 重量级依赖 (确定性)：导入时新加载了基线里没有的重量级依赖 -> 失败 (退出码 1)
+- 导入耗时 (受机器抖动影响)：同一次运行里先测一遍空解释器 (python -c pass) 作为参照，
+  只比较各目标比空解释器多出的耗时；超出基线上限时只给出警告，不判为失败
+
+app.py 会执行 Streamlit 页面逻辑，不能直接 import；这里用 ast 取出它顶层的 import 语句单独执行，
+测的就是脚本启动时的导入开销
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "importtime_baseline.json")
+
+TARGET_MODULES = [
+    "src.parser.smart_parser",
+    "src.rag.vector_storage",
+    "src.rag.reranker",
+    "src.rag.embedding_client",
+    "src.llm.rag_chain",
+    "src.ingest.job_queue",
+    "src.ingest.dedup",
+    "src.rag.embedding_cache",
+    "src.llm.bulk_qa",
+    "src.server.rag_server",
+    "src.ui.stream_renderer",
+]
+
+# 这些依赖只允许在第一次真正使用时加载
+HEAVY_MODULES = [
+    "paddleocr", "paddle", "FlagEmbedding", "torch", "transformers",
+    "cv2", "fitz", "pymupdf", "faiss", "langchain", "langchain_community", "langchain_core", "dashscope",
+]
+
+# 导入耗时的警告阈值 (比空解释器多出的耗时)：基线 x (1 + TOLERANCE) + SLACK_MS
+TOLERANCE = 0.5
+SLACK_MS = 30
+
+
+def app_import_source(app_path="app.py"):
+    with open(app_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in imports)
+
+
+def measure(source):
+    """
+    在独立子进程里执行 source，返回 (总导入耗时 ms, 最重的顶层导入, 被加载的重量级依赖)
+    """
+    probe = source + "\nimport sys, json\nprint(json.dumps(sorted(m for m in %r if m in sys.modules)))" % HEAVY_MODULES
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    roots = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        cumulative_us, name = int(parts[1]), parts[2]
+        # 顶层导入的包名前面没有缩进
+        if name.startswith(" ") and not name.startswith("  "):
+            roots.append((name.strip(), cumulative_us / 1000))
+
+    heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    total_ms = sum(ms for _, ms in roots)
+    top = sorted(roots, key=lambda r: r[1], reverse=True)[:8]
+    return total_ms, top, heavy
+
+
+def measure_all(repeat):
+    # 参照：空解释器的启动导入 (site、encodings 等)，与各目标在同一次运行里测量
+    reference_ms = min(measure("pass")[0] for _ in range(repeat))
+
+    targets = {"app.py": app_import_source()}
+    targets.update({m: f"import {m}" for m in TARGET_MODULES})
+
+    results = {}
+    for name, source in targets.items():
+        runs = [measure(source) for _ in range(repeat)]
+        total_ms, top, heavy = min(runs, key=lambda r: r[0])
+        results[name] = {
+            "import_ms": round(total_ms, 1),
+            "over_reference_ms": round(max(total_ms - reference_ms, 0.0), 1),
+            "heavy_modules": heavy,
+            "top_imports": [{"module": m, "ms": round(ms, 1)} for m, ms in top],
+        }
+    return reference_ms, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="每个目标测量次数，取最小值")
+    parser.add_argument("--write-baseline", action="store_true")
+    args = parser.parse_args()
+
+    reference_ms, results = measure_all(args.repeat)
+
+    print(f"空解释器参照: {reference_ms:.1f} ms\n")
+    print(f"{'目标':<28} {'导入耗时(ms)':>12} {'比参照多(ms)':>12}  重量级依赖")
+    for name, r in results.items():
+        print(f"{name:<30} {r['import_ms']:>12.1f} {r['over_reference_ms']:>14.1f}  "
+              f"{', '.join(r['heavy_modules']) or '-'}")
+
+    if args.write_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline["environment"] = {"python": platform.python_version(), "platform": platform.platform(),
+                                   "reference_ms": round(reference_ms, 1)}
+        baseline["targets"] = results
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 基线已写入 {BASELINE_PATH}")
+        return
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("targets")
+    if not baseline:
+        print("\n⚠️ 没有基线，先运行 --write-baseline")
+        return
+
+    failures, warnings = [], []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            # 基线里没有的目标：不允许加载任何重量级依赖
+            base = {"heavy_modules": []}
+            warnings.append(f"{name} 不在基线中，请运行 --write-baseline")
+        new_heavy = set(r["heavy_modules"]) - set(base["heavy_modules"])
+        if new_heavy:
+            failures.append(f"{name} 在导入时新加载了重量级依赖: {', '.join(sorted(new_heavy))}")
+        if "over_reference_ms" in base:
+            limit = base["over_reference_ms"] * (1 + TOLERANCE) + SLACK_MS
+            if r["over_reference_ms"] > limit:
+                warnings.append(f"{name} 比空解释器多 {r['over_reference_ms']:.1f} ms，超过基线上限 {limit:.1f} ms")
+
+    if warnings:
+        print("\n⚠️ 导入耗时警告 (耗时受机器抖动影响，不判为失败)：")
+        for w in warnings:
+            print(f"   - {w}")
+    if failures:
+        print("\n❌ 启动耗时回归：")
+        for f in failures:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("\n✅ 未发现启动耗时回归")
+
+
+if __name__ == "__main__":
+    main()
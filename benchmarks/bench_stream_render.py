@@ -0,0 +1,118 @@
+"""
+流式渲染基准测试：模拟数千个 token 的回答流，对比
+    naive    : 每个 token 都 placeholder.markdown(全文 + "▌") (app.py 原来的写法)
+    renderer : StreamRenderer 节流渲染 (只在 write 时刷新)
+    consume  : StreamRenderer.consume (上游停顿时按帧刷新缓存的 token)
+stub placeholder 会把每次渲染的内容序列化 (模拟发往前端的 websocket 消息)，统计渲染次数和传输字节数
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.bench_stream_render --tokens 5000 --token-interval 0.001 --stall-every 500 --stall 1.5
+"""
+import argparse
+import json
+import random
+import time
+
+from src.ui.stream_renderer import StreamRenderer
+
+WORDS = ["文章", "提出", "了", "一种", "基于", "混合", "检索", "的", "方法", "，", "。", "**要点**", " (来自第2页)"]
+
+
+class StubPlaceholder:
+    def __init__(self):
+        self.renders = 0
+        self.bytes_sent = 0
+        self.first_paint = None
+        self.painted_chars = 0
+
+    def markdown(self, text):
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter()
+        self.renders += 1
+        self.painted_chars = len(text.rstrip("▌"))
+        self.bytes_sent += len(json.dumps({"markdown": text}, ensure_ascii=False).encode("utf-8"))
+
+
+class Staleness:
+    """记录上游停顿期间，已生成但还没画出来的内容持续了多久 (取最大值)"""
+
+    def __init__(self):
+        self.chars = 0
+        self.max_stale = 0.0
+
+    def check(self, placeholder, waited):
+        if placeholder.painted_chars < self.chars:
+            self.max_stale = max(self.max_stale, waited)
+
+
+def stub_stream(n_tokens, interval, seed=0, stall_every=0, stall=0.0, placeholder=None, staleness=None):
+    rng = random.Random(seed)
+    for i in range(n_tokens):
+        if interval:
+            time.sleep(interval)
+        if stall_every and i and i % stall_every == 0:
+            # 模拟 LLM 卡顿：停顿结束时检查停顿前的内容是否已经画出来
+            time.sleep(stall)
+            if staleness:
+                staleness.check(placeholder, stall)
+        token = "\n\n* " if i % 60 == 59 else rng.choice(WORDS)
+        if staleness:
+            staleness.chars += len(token)
+        yield token
+
+
+def _stream(args, placeholder, staleness):
+    return stub_stream(args.tokens, args.token_interval, stall_every=args.stall_every, stall=args.stall,
+                       placeholder=placeholder, staleness=staleness)
+
+
+def run_naive(args, staleness):
+    placeholder = StubPlaceholder()
+    start = time.perf_counter()
+    full_response = ""
+    for token in _stream(args, placeholder, staleness):
+        full_response += token
+        placeholder.markdown(full_response + "▌")
+    placeholder.markdown(full_response)
+    return placeholder, start, time.perf_counter() - start
+
+
+def run_renderer(args, staleness):
+    placeholder = StubPlaceholder()
+    start = time.perf_counter()
+    renderer = StreamRenderer(placeholder, max_fps=args.max_fps)
+    for token in _stream(args, placeholder, staleness):
+        renderer.write(token)
+    renderer.close()
+    return placeholder, start, time.perf_counter() - start
+
+
+def run_consume(args, staleness):
+    placeholder = StubPlaceholder()
+    start = time.perf_counter()
+    StreamRenderer(placeholder, max_fps=args.max_fps).consume(_stream(args, placeholder, staleness))
+    return placeholder, start, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--token-interval", type=float, default=0.001, help="模拟 LLM 吐 token 的间隔 (秒)")
+    parser.add_argument("--max-fps", type=float, default=8)
+    parser.add_argument("--stall-every", type=int, default=0, help="每隔多少个 token 模拟一次 LLM 卡顿 (0 为不卡顿)")
+    parser.add_argument("--stall", type=float, default=1.5, help="每次卡顿的时长 (秒)")
+    args = parser.parse_args()
+
+    print(f"🧪 {args.tokens} 个 token, 间隔 {args.token_interval * 1000:.1f} ms"
+          + (f", 每 {args.stall_every} 个 token 卡顿 {args.stall}s" if args.stall_every else "") + "\n")
+    print(f"{'':<10} {'渲染次数':>8} {'传输(MB)':>10} {'首屏(ms)':>10} {'总耗时(s)':>10} {'卡顿时未显示(s)':>14}")
+    for name, fn in (("naive", run_naive), ("renderer", run_renderer), ("consume", run_consume)):
+        staleness = Staleness()
+        placeholder, start, elapsed = fn(args, staleness)
+        ttfp = (placeholder.first_paint - start) * 1000
+        print(f"{name:<10} {placeholder.renders:>10} {placeholder.bytes_sent / 1e6:>12.2f} "
+              f"{ttfp:>12.2f} {elapsed:>12.2f} {staleness.max_stale:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+查询服务压测：用桩后端 (固定检索延迟 + 按间隔吐 token 的假 LLM) 启动 rag_server，
+在多个并发级别下发起 /query 请求，统计 requests/sec、延迟分位数、首 token 延迟和 503 数量
+
+用法 (在项目根目录下运行)：
+    python -m benchmarks.load_test_server --levels 1 8 32 64 --requests 200
+    # 压测已经在运行的真实服务：
+    python -m benchmarks.load_test_server --url http://127.0.0.1:8080 --db-name 我的文档
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+from src.server.rag_server import create_app
+
+
+class StubBackend:
+    """不依赖模型和 API 的桩后端"""
+
+    def __init__(self, retrieve_latency, tokens, token_interval):
+        self.retrieve_latency = retrieve_latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+
+    def warmup(self):
+        pass
+
+    def retrieve(self, query, db_name, chat_history):
+        time.sleep(self.retrieve_latency)
+        return [SimpleNamespace(page_content=f"桩文档 {i}", metadata={"human_page_number": i + 1})
+                for i in range(3)]
+
+    def generate(self, query, docs):
+        for i in range(self.tokens):
+            time.sleep(self.token_interval)
+            yield f"token{i} "
+
+
+async def one_query(session, url, db_name, i):
+    start = time.perf_counter()
+    first_token = None
+    payload = {"query": f"第 {i} 个问题", "db_name": db_name}
+    async with session.post(f"{url}/query", json=payload) as resp:
+        if resp.status != 200:
+            await resp.read()
+            return resp.status, time.perf_counter() - start, None
+        event = None
+        async for raw in resp.content:
+            line = raw.decode("utf-8").strip()
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "token" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line.startswith("data:") and event == "error":
+                return json.loads(line[5:]).get("error", "error"), time.perf_counter() - start, first_token
+    return 200, time.perf_counter() - start, first_token
+
+
+async def run_level(url, db_name, concurrency, n_requests):
+    sem = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def worker(session, i):
+        async with sem:
+            results.append(await one_query(session, url, db_name, i))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session, i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[0] == 200]
+    latencies = sorted(r[1] * 1000 for r in ok)
+    ttft = [r[2] * 1000 for r in ok if r[2] is not None]
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+    print(f"{concurrency:>6} {len(ok) / elapsed:>9.1f} {pct(latencies, 0.5):>9.0f} {pct(latencies, 0.95):>9.0f} "
+          f"{statistics.median(ttft) if ttft else float('nan'):>10.0f} "
+          f"{sum(1 for r in results if r[0] == 503):>6} {sum(1 for r in results if r[0] not in (200, 503)):>6}")
+
+
+async def main_async(args):
+    runner = None
+    url = args.url
+    if url is None:
+        backend = StubBackend(args.retrieve_latency, args.tokens, args.token_interval)
+        app = create_app(backend, max_concurrency=args.max_concurrency, max_queue=args.max_queue, warmup=False)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+        print(f"🧪 桩后端: 检索 {args.retrieve_latency * 1000:.0f} ms, {args.tokens} tokens x "
+              f"{args.token_interval * 1000:.0f} ms; 服务并发上限 {args.max_concurrency}, 排队上限 {args.max_queue}\n")
+
+    print(f"{'并发':>6} {'req/s':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'首token(ms)':>10} {'503':>6} {'错误':>6}")
+    try:
+        for level in args.levels:
+            await run_level(url, args.db_name, level, args.requests)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="压测已有服务；不填则启动带桩后端的本地服务")
+    parser.add_argument("--db-name", default="stub")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--retrieve-latency", type=float, default=0.03)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
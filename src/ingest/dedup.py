@@ -0,0 +1,276 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import contextlib
+from src.utils.loaders import load_fitz, load_numpy
+
+DEDUP_DB_PATH = os.path.join("data", "dedup.sqlite")
+
+# MinHash / LSH 参数：128 个哈希函数分成 16 个 band，每个 band 8 行
+# 估计 Jaccard 约 0.7 以上的页面会成为候选，再用完整签名按 threshold 精确筛选
+NUM_PERM = 128
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+_MERSENNE_PRIME = (1 << 61) - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    db_name      TEXT NOT NULL,
+    db_path      TEXT,
+    file_name    TEXT,
+    page_count   INTEGER,
+    created_at   REAL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    db_name      TEXT PRIMARY KEY,
+    target       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT,
+    page_number  INTEGER,
+    image_hash   TEXT,
+    signature    BLOB,
+    content      TEXT,
+    method       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pages_image ON pages (image_hash);
+CREATE TABLE IF NOT EXISTS lsh (
+    band         INTEGER,
+    bucket       BLOB,
+    page_id      INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_lsh ON lsh (band, bucket);
+CREATE INDEX IF NOT EXISTS idx_lsh_page ON lsh (page_id);
+"""
+
+# 同一文档的同一页只保留一条记录 (重新解析时覆盖)。
+# 单独建唯一索引而不是写在建表语句里，这样旧版本建好的库也能升级：先清掉重复的旧记录再建索引
+_PAGES_UNIQUE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_pages_doc ON pages (content_hash, page_number)"
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """PDF 文件内容的 SHA-256，文件名不同但内容相同的上传会得到同一个哈希"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MinHasher:
+    """
+    基于字符 n-gram (默认 5 字) 的 MinHash，对中文不需要分词
+    h(x) = (a * crc32(x) + b) mod p，a/b 由固定种子生成，保证不同进程得到的签名一致
+    """
+
+    def __init__(self, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+        np = load_numpy()
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # a < 2^31、crc32 < 2^32，乘积不会溢出 uint64
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        np = load_numpy()
+        text = "".join(text.split())
+        if not text:
+            return None
+        n = self.shingle_size
+        shingles = {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        values = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_MERSENNE_PRIME)
+        return values.min(axis=0)
+
+    @staticmethod
+    def jaccard(sig_a, sig_b):
+        return float((sig_a == sig_b).mean())
+
+
+class DedupLibrary:
+    """
+    跨文档的去重库 (SQLite，UI 进程和解析 worker 进程共享)：
+    - documents : PDF 内容哈希 -> 已有索引
+    - aliases   : 重复上传的文档名 -> 实际使用的索引名
+    - pages     : 每页的 MinHash 签名 / 页面图像哈希 / 解析结果，用于跨文档复用
+    - lsh       : MinHash 的 LSH 分桶，用于快速找到近似重复页
+    """
+
+    def __init__(self, path=DEDUP_DB_PATH, threshold=0.95):
+        self.path = path
+        self.threshold = threshold
+        self._hasher = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # 多个 worker 进程可能同时打开新库：检查 + 迁移放在同一个写事务里，只有一个进程会执行
+            conn.execute("BEGIN IMMEDIATE")
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_pages_doc'").fetchone():
+                conn.execute("DELETE FROM pages WHERE id NOT IN "
+                             "(SELECT MAX(id) FROM pages GROUP BY content_hash, page_number)")
+                conn.execute("DELETE FROM lsh WHERE page_id NOT IN (SELECT id FROM pages)")
+                conn.execute(_PAGES_UNIQUE_INDEX)
+
+    @property
+    def hasher(self):
+        # 只做文档级查询 (如 UI 上传时) 不需要加载 numpy
+        if self._hasher is None:
+            self._hasher = MinHasher()
+        return self._hasher
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------- 文档级：精确去重 ----------
+    def find_document(self, content_hash):
+        """返回内容完全相同、且索引仍然存在的文档"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT db_name, db_path, file_name, page_count FROM documents WHERE content_hash = ?",
+                (content_hash,),
+            ).fetchone()
+        if not row or not row[1] or not os.path.exists(os.path.join(row[1], "index.faiss")):
+            return None
+        return {"db_name": row[0], "db_path": row[1], "file_name": row[2], "page_count": row[3]}
+
+    def add_document(self, content_hash, db_name, db_path, file_name, page_count):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, db_name, db_path, file_name, page_count, time.time()),
+            )
+
+    def add_alias(self, db_name, target):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (db_name, target))
+
+    def resolve(self, db_name):
+        """文档名 -> 实际索引名 (不是重复文档时原样返回)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT target FROM aliases WHERE db_name = ?", (db_name,)).fetchone()
+        return row[0] if row else db_name
+
+    def is_alias(self, db_name):
+        return self.resolve(db_name) != db_name
+
+    def remove(self, db_name):
+        """删除文档时调用：去掉它作为别名的记录、指向它的别名、文档记录，以及它的页面和 LSH 分桶"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM aliases WHERE db_name = ? OR target = ?", (db_name, db_name))
+            hashes = "SELECT content_hash FROM documents WHERE db_name = ?"
+            conn.execute(f"DELETE FROM lsh WHERE page_id IN "
+                         f"(SELECT id FROM pages WHERE content_hash IN ({hashes}))", (db_name,))
+            conn.execute(f"DELETE FROM pages WHERE content_hash IN ({hashes})", (db_name,))
+            conn.execute("DELETE FROM documents WHERE db_name = ?", (db_name,))
+
+    # ---------- 页面级：近似去重 ----------
+    def page_fingerprint(self, page, raw_text, need_ocr):
+        """
+        有可用文本层的页面用文本的 MinHash 签名；需要 OCR 的页面 (扫描件) 用低分辨率灰度渲染图的哈希
+        """
+        if not need_ocr:
+            return {"signature": self.hasher.signature(raw_text), "image_hash": None}
+        fitz = load_fitz()
+        pix = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5), colorspace=fitz.csGRAY, alpha=False)
+        return {"signature": None, "image_hash": hashlib.sha1(pix.samples).hexdigest()}
+
+    def _bands(self, signature):
+        rows = len(signature) // LSH_BANDS
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+
+    def find_page(self, fingerprint):
+        """返回已解析过的重复/近似重复页 {"content", "method", "similarity"}，没有则返回 None"""
+        np = load_numpy()
+        with self._connect() as conn:
+            if fingerprint["image_hash"]:
+                row = conn.execute(
+                    "SELECT content, method FROM pages WHERE image_hash = ? LIMIT 1",
+                    (fingerprint["image_hash"],),
+                ).fetchone()
+                return {"content": row[0], "method": row[1], "similarity": 1.0} if row else None
+
+            signature = fingerprint["signature"]
+            if signature is None:
+                return None
+            candidates = set()
+            for band, bucket in self._bands(signature):
+                candidates.update(r[0] for r in conn.execute(
+                    "SELECT page_id FROM lsh WHERE band = ? AND bucket = ?", (band, bucket)))
+
+            candidates = list(candidates)
+            rows = []
+            # 候选页一次性取回 (分批是为了不超过 SQLite 的参数个数上限)
+            for start in range(0, len(candidates), 500):
+                ids = candidates[start:start + 500]
+                rows += conn.execute(
+                    f"SELECT signature, content, method FROM pages WHERE id IN ({','.join('?' * len(ids))})",
+                    ids).fetchall()
+
+            best = None
+            for row in rows:
+                similarity = self.hasher.jaccard(signature, np.frombuffer(row[0], dtype=np.uint64))
+                if similarity >= self.threshold and (best is None or similarity > best["similarity"]):
+                    best = {"content": row[1], "method": row[2], "similarity": similarity}
+        return best
+
+    def add_page(self, content_hash, page_number, fingerprint, content, method):
+        # OCR 页面额外记录识别结果的文本签名，之后带文本层的版本也能匹配上
+        signature = fingerprint["signature"]
+        if signature is None:
+            signature = self.hasher.signature(content)
+        with self._connect() as conn:
+            # 同一页重新解析：替换旧记录，并删掉旧记录的 LSH 分桶
+            conn.execute("DELETE FROM lsh WHERE page_id IN "
+                         "(SELECT id FROM pages WHERE content_hash = ? AND page_number = ?)",
+                         (content_hash, page_number))
+            cur = conn.execute(
+                "INSERT OR REPLACE INTO pages (content_hash, page_number, image_hash, signature, content, method) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, page_number, fingerprint["image_hash"],
+                 signature.tobytes() if signature is not None else None, content, method),
+            )
+            if signature is not None:
+                conn.executemany("INSERT INTO lsh VALUES (?, ?, ?)",
+                                 [(band, bucket, cur.lastrowid) for band, bucket in self._bands(signature)])
+
+
+class PageDeduper:
+    """
+    单个文档解析过程中的页面去重助手，传给 smart_extract(page_dedup=...)
+    - 扫描页 (需要 OCR)：渲染图与已解析页完全相同时直接复用 OCR 结果
+    - 文本页：用 MinHash/LSH 找出近似重复页，但仍以本页文本层为准 (抽取几乎没有成本，
+      复用旧文本会把修订内容丢掉)；未改动的切片在向量化阶段由 CachedEmbeddings 复用
+    stats 记录近似重复页数和省下的 OCR 次数
+    """
+
+    def __init__(self, library, content_hash):
+        self.library = library
+        self.content_hash = content_hash
+        self.stats = {"near_duplicate_pages": 0, "ocr_pages_saved": 0}
+
+    def lookup(self, page, raw_text, need_ocr):
+        """返回 (fingerprint, 可复用的页面)；只有扫描页完全相同时第二项才不为 None"""
+        fingerprint = self.library.page_fingerprint(page, raw_text, need_ocr)
+        match = self.library.find_page(fingerprint)
+        if not match:
+            return fingerprint, None
+        self.stats["near_duplicate_pages"] += 1
+        if need_ocr:
+            self.stats["ocr_pages_saved"] += 1
+            return fingerprint, match
+        return fingerprint, None
+
+    def remember(self, page_number, fingerprint, content, method):
+        self.library.add_page(self.content_hash, page_number, fingerprint, content, method)
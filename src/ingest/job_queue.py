@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import uuid
+import threading
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from src.utils.loaders import load_psutil
+
+JOB_DIR = os.path.join("data", "jobs")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (PENDING, RUNNING)
+RETRYABLE_STATUSES = (FAILED, CANCELLED)
+
+
+class IngestCancelled(Exception):
+    """解析任务被用户取消"""
+
+
+class JobStore:
+    """
+    基于 JSON 文件的任务状态存储：每个任务一个文件 (data/jobs/<job_id>.json)
+    写入采用 临时文件 + os.replace，保证 UI 进程读取时不会读到半截文件
+    主进程和各个 worker 进程通过同一个目录共享状态
+    取消请求单独用标记文件 (<job_id>.cancel) 表示，避免和 worker 写进度时互相覆盖
+    """
+
+    def __init__(self, job_dir=JOB_DIR):
+        self.job_dir = job_dir
+        os.makedirs(job_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.cancel")
+
+    def _write(self, job):
+        path = self._path(job["job_id"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def create(self, pdf_path, db_name, owner=None, db_dir=None):
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "pdf_path": pdf_path,
+            "db_name": db_name,
+            "db_dir": db_dir,
+            "status": PENDING,
+            "stage": "排队中",
+            "pages_done": 0,
+            "pages_total": 0,
+            "attempts": 1,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            **(owner or {}),
+        }
+        with self._lock:
+            self._write(job)
+        return job
+
+    def get(self, job_id):
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        job["cancel_requested"] = self.is_cancel_requested(job_id)
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job["updated_at"] = time.time()
+            job.pop("cancel_requested", None)
+            self._write(job)
+            job["cancel_requested"] = self.is_cancel_requested(job_id)
+            return job
+
+    def request_cancel(self, job_id):
+        open(self._cancel_path(job_id), "w").close()
+
+    def clear_cancel(self, job_id):
+        try:
+            os.remove(self._cancel_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def is_cancel_requested(self, job_id):
+        return os.path.exists(self._cancel_path(job_id))
+
+    def claim(self, job_id, owner):
+        """
+        接管一个原属主进程已退出的任务：以独占方式创建 <job_id>.<原属主>.claim 标记，
+        同时启动的多个服务进程里只有一个能接管成功
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        try:
+            os.close(os.open(os.path.join(self.job_dir, f"{job_id}.{job.get('owner_pid')}-{int(job.get('owner_started', 0))}.claim"),
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        return self.update(job_id, **owner)
+
+    def list(self):
+        jobs = []
+        for name in os.listdir(self.job_dir):
+            if name.endswith(".json"):
+                job = self.get(name[:-5])
+                if job:
+                    jobs.append(job)
+        jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs
+
+    def delete(self, job_id):
+        self.clear_cancel(job_id)
+        for name in os.listdir(self.job_dir):
+            if name.startswith(f"{job_id}.") and name.endswith(".claim"):
+                os.remove(os.path.join(self.job_dir, name))
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+def _current_owner():
+    """当前进程作为任务属主的标识：pid + 进程启动时间 (防止 pid 被新进程复用后误判为存活)"""
+    psutil = load_psutil()
+    return {"owner_pid": os.getpid(), "owner_started": psutil.Process().create_time()}
+
+
+def _owner_alive(job):
+    psutil = load_psutil()
+    pid = job.get("owner_pid")
+    if pid is None:
+        return False
+    try:
+        started = psutil.Process(pid).create_time()
+    except psutil.Error:
+        return False
+    return abs(started - job.get("owner_started", 0)) < 1
+
+
+# ================= worker 进程 =================
+
+_ocr_engine = None
+
+
+def _get_ocr_engine():
+    """每个 worker 进程只在第一次真正需要 OCR 时才加载 PaddleOCR 模型"""
+    global _ocr_engine
+    if _ocr_engine is None:
+        from src.utils.loaders import load_paddleocr
+        PaddleOCR = load_paddleocr()
+        _ocr_engine = PaddleOCR(use_angle_cls=True, lang="ch")
+    return _ocr_engine
+
+
+def _warmup_worker():
+    """预热：在 worker 进程里提前导入解析依赖并加载 OCR 模型"""
+    import src.parser.smart_parser  # noqa: F401
+    _get_ocr_engine()
+
+
+class _LazyOCREngine:
+    def predict(self, img):
+        return _get_ocr_engine().predict(img)
+
+
+def _run_job(job_id, job_dir, ocr_semaphore):
+    """
+    在 worker 进程中执行单个解析任务：smart_extract -> build_vector_db
+    每解析完一页就写回进度，并检查是否收到取消请求
+    内容完全相同的 PDF 直接复用已有索引；近似重复的页面复用解析结果，相同切片复用向量
+    """
+    from src.parser.smart_parser import smart_extract
+    from src.rag.vector_storage import build_vector_db, DB_DATA_DIR
+    from src.rag.embedding_client import get_embedding_client
+    from src.rag.embedding_cache import CachedEmbeddings
+    from src.ingest.dedup import DedupLibrary, PageDeduper, file_content_hash
+
+    store = JobStore(job_dir)
+    job = store.get(job_id)
+    if job is None:
+        return
+    if job["cancel_requested"]:
+        store.update(job_id, status=CANCELLED, stage="已取消")
+        return
+
+    store.update(job_id, status=RUNNING, stage="解析中", started_at=time.time())
+
+    def on_progress(pages_done, pages_total):
+        store.update(job_id, pages_done=pages_done, pages_total=pages_total)
+        if store.is_cancel_requested(job_id):
+            raise IngestCancelled()
+
+    try:
+        library = DedupLibrary()
+        content_hash = file_content_hash(job["pdf_path"])
+
+        # 1. 文档级去重：内容完全相同的 PDF 不再解析，直接指向已有索引
+        existing = library.find_document(content_hash)
+        if existing and existing["db_name"] != job["db_name"]:
+            library.add_alias(job["db_name"], existing["db_name"])
+            print(f"♻️ [Dedup] {job['db_name']} 与 {existing['db_name']} 内容相同，复用已有索引")
+            store.update(job_id, status=DONE, stage="复用已有索引", finished_at=time.time(),
+                         pages_done=existing["page_count"], pages_total=existing["page_count"],
+                         dedup={"duplicate_of": existing["db_name"], "near_duplicate_pages": existing["page_count"]})
+            return
+
+        # 2. 页面级去重 (扫描页复用 OCR 结果) + 向量缓存 (未改动的切片复用向量)
+        page_dedup = PageDeduper(library, content_hash)
+        raw = smart_extract(job["pdf_path"], _LazyOCREngine(),
+                            progress_callback=on_progress, ocr_lock=ocr_semaphore, page_dedup=page_dedup)
+
+        if store.is_cancel_requested(job_id):
+            raise IngestCancelled()
+        store.update(job_id, stage="构建索引中")
+        # 每个 worker 进程内复用同一个 EmbeddingClient，外面包一层持久化向量缓存
+        embeddings = CachedEmbeddings(get_embedding_client())
+        db_path = build_vector_db(raw, job["db_name"], embeddings, db_dir=job.get("db_dir") or DB_DATA_DIR)
+        if db_path is None:
+            raise RuntimeError("索引构建失败，详见 worker 日志")
+        library.add_document(content_hash, job["db_name"], db_path,
+                             os.path.basename(job["pdf_path"]), store.get(job_id)["pages_total"])
+
+        dedup = {
+            "near_duplicate_pages": page_dedup.stats["near_duplicate_pages"],
+            "ocr_pages_saved": page_dedup.stats["ocr_pages_saved"],
+            "embeddings_reused": embeddings.stats["hits"],
+            "embeddings_computed": embeddings.stats["misses"],
+        }
+        print(f"♻️ [Dedup] {job['db_name']}: 省下 {dedup['ocr_pages_saved']} 次 OCR，复用 {dedup['embeddings_reused']} 个向量 "
+              f"(检测到 {dedup['near_duplicate_pages']} 页近似重复)")
+        store.update(job_id, status=DONE, stage="完成", finished_at=time.time(), dedup=dedup)
+    except IngestCancelled:
+        store.update(job_id, status=CANCELLED, stage="已取消", finished_at=time.time())
+    except Exception as e:
+        traceback.print_exc()
+        store.update(job_id, status=FAILED, stage="失败", error=str(e), finished_at=time.time())
+
+
+# ================= 服务 =================
+
+class IngestService:
+    """
+    后台解析服务：任务队列 + worker 进程池
+    - max_workers: 同时解析的文档数
+    - ocr_workers: 同时执行 OCR 的页数上限 (跨进程共享信号量，OCR 是最吃资源的部分)
+    - db_dir: 索引保存目录，记录在每个任务里 (默认 data/vector_dbs)
+    任务状态持久化在 JobStore 中，UI 只需轮询，不会被阻塞
+    每个任务记录派发它的服务进程 (owner_pid)；Streamlit 和查询服务可以共用同一个任务目录，
+    各自只执行自己派发的任务
+    """
+
+    def __init__(self, job_dir=JOB_DIR, max_workers=3, ocr_workers=1, db_dir=None):
+        self.store = JobStore(job_dir)
+        self.db_dir = db_dir
+        self.owner = _current_owner()
+        # 用 spawn 启动子进程：fork 会把 UI / 查询服务进程里已建立的连接池、模型和线程一起复制给 worker
+        ctx = multiprocessing.get_context("spawn")
+        self._manager = ctx.Manager()
+        self._ocr_semaphore = self._manager.BoundedSemaphore(ocr_workers)
+        self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+        self._recover()
+
+    def _recover(self):
+        """
+        属主进程已退出的遗留任务：排队中的重新入队，运行中的标记为中断 (可重试)
+        属主仍在运行的任务 (例如另一个服务进程派发的) 不做处理
+        """
+        for job in self.store.list():
+            if job["status"] not in ACTIVE_STATUSES or _owner_alive(job):
+                continue
+            job = self.store.claim(job["job_id"], self.owner)
+            if job is None:
+                continue
+            if job["status"] == PENDING:
+                self._dispatch(job["job_id"])
+            elif job["status"] == RUNNING:
+                self.store.update(job["job_id"], status=FAILED, stage="失败",
+                                  error="服务重启，任务被中断")
+
+    def _dispatch(self, job_id):
+        self._pool.submit(_run_job, job_id, self.store.job_dir, self._ocr_semaphore)
+
+    def warmup_ocr(self):
+        """
+        在后台预热一个 worker 的 OCR 模型；其余 worker 仍在第一次 OCR 时按需加载，避免每个进程都占一份内存
+        """
+        self._pool.submit(_warmup_worker)
+
+    def submit(self, pdf_path, db_name):
+        """提交解析任务；同一个文档已有进行中的任务时直接返回该任务"""
+        active = self.active_job_for(db_name)
+        if active:
+            return active
+        job = self.store.create(pdf_path, db_name, self.owner, self.db_dir)
+        self._dispatch(job["job_id"])
+        return job
+
+    def cancel(self, job_id):
+        """
+        请求取消：排队中的任务在开始前退出，运行中的任务在下一页解析完成后退出
+        """
+        job = self.store.get(job_id)
+        if job and job["status"] in ACTIVE_STATUSES:
+            self.store.request_cancel(job_id)
+
+    def retry(self, job_id):
+        job = self.store.get(job_id)
+        if not job or job["status"] not in RETRYABLE_STATUSES:
+            return job
+        self.store.clear_cancel(job_id)
+        job = self.store.update(job_id, status=PENDING, stage="排队中", error=None,
+                                pages_done=0, attempts=job["attempts"] + 1, **self.owner)
+        self._dispatch(job_id)
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list_jobs(self):
+        return self.store.list()
+
+    def active_job_for(self, db_name):
+        for job in self.store.list():
+            if job["db_name"] == db_name and job["status"] in ACTIVE_STATUSES:
+                return job
+        return None
+
+    def clear_finished(self):
+        for job in self.store.list():
+            if job["status"] not in ACTIVE_STATUSES:
+                self.store.delete(job["job_id"])
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
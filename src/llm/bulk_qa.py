@@ -0,0 +1,275 @@
+"""
+批量问答：对一个或多个索引一次性跑一批标准问题
+
+与逐个调用 get_answer_stream 相比：
+- 每个索引只加载一次
+- 所有问题分批向量化 (EmbeddingClient.embed_queries)
+- 每个索引只做一次批量 FAISS 检索 (问题向量组成矩阵，一次 index.search)
+- 所有 (问题, 文档) 对放在共享的大批次里重排序
+- LLM 生成在并发上限内并行，每完成一个问题就追加写入 JSONL
+- 默认断点续跑：结果文件里已经成功回答的问题会跳过，失败的问题重新回答 (--restart 从头开始)
+
+用法 (在项目根目录下运行)：
+    python -m src.llm.bulk_qa questions.txt --index 手册A --index 手册B --output results.jsonl
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.llm.rag_chain import load_vectorstore, normalize_page_numbers, build_messages, generate_answer
+from src.utils.loaders import load_document_class, load_numpy
+
+DB_DATA_DIR = os.path.join("data", "vector_dbs")
+
+
+def load_questions(path):
+    """读取问题列表：.jsonl 每行 {"id": ..., "question": ...}；其他格式每行一个问题"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(line)
+                questions.append({"id": item.get("id", len(questions)), "question": item["question"]})
+            else:
+                questions.append({"id": len(questions), "question": line})
+    return questions
+
+
+def embed_questions(questions, embedding_model):
+    """分批向量化所有问题；没有 embed_queries 的模型退化为 embed_documents"""
+    texts = [q["question"] for q in questions]
+    if hasattr(embedding_model, "embed_queries"):
+        return embedding_model.embed_queries(texts)
+    return embedding_model.embed_documents(texts)
+
+
+def batch_search(vectorstore, index_name, query_vectors, k=20):
+    """
+    对一个索引做一次批量检索，返回每个问题的 [(distance, Document), ...]
+    Document 是副本，metadata 里额外记录来源索引 index
+    """
+    np = load_numpy()
+    Document = load_document_class()
+    matrix = np.asarray(query_vectors, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    # 内积越大越相似，L2 距离越小越相似；统一成“越小越相似”方便跨索引合并
+    sign = -1 if getattr(vectorstore, "distance_strategy", None) == "MAX_INNER_PRODUCT" else 1
+    scores, indices = vectorstore.index.search(matrix, min(k, vectorstore.index.ntotal))
+
+    results = []
+    for row_scores, row_indices in zip(scores, indices):
+        hits = []
+        for score, i in zip(row_scores, row_indices):
+            if i == -1:
+                continue
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            hits.append((sign * float(score),
+                         Document(page_content=doc.page_content, metadata={**doc.metadata, "index": index_name})))
+        results.append(hits)
+    return results
+
+
+def rerank_batch(questions, candidates, top_k=10, batch_size=256):
+    """
+    把所有问题的 (问题, 文档) 对拼在一起，按 batch_size 分批送进同一个 Reranker
+    返回 (每个问题重排后的文档, 每个问题的重排错误)
+    某一批重排失败时，涉及的问题保持向量检索的顺序并记录错误，其余问题不受影响
+    未安装 FlagEmbedding / transformers 时保持向量检索的顺序
+    """
+    errors = [None] * len(questions)
+    try:
+        from src.rag.reranker import get_reranker
+        reranker = get_reranker()
+    except ImportError:
+        return [docs[:top_k] for docs in candidates], errors
+
+    pairs, owners = [], []
+    for i, (q, docs) in enumerate(zip(questions, candidates)):
+        pairs.extend([q["question"], d.page_content] for d in docs)
+        owners.extend([i] * len(docs))
+
+    scores = []
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        try:
+            batch_scores = reranker.compute_score(batch)
+            scores.extend([batch_scores] if isinstance(batch_scores, float) else batch_scores)
+        except Exception as e:
+            print(f"⚠️ [BulkQA] 第 {start // batch_size + 1} 批重排失败: {e}")
+            scores.extend([None] * len(batch))
+            for i in set(owners[start:start + batch_size]):
+                errors[i] = f"重排失败: {e}"
+
+    final, offset = [], 0
+    for docs, error in zip(candidates, errors):
+        doc_scores = list(zip(docs, scores[offset:offset + len(docs)]))
+        if error is None:
+            doc_scores.sort(key=lambda x: x[1], reverse=True)
+        final.append([doc for doc, _ in doc_scores[:top_k]])
+        offset += len(docs)
+    return final, errors
+
+
+def load_finished(output_path):
+    """
+    读取已有结果文件中成功回答的记录，并把文件重写为只包含这些记录
+    (失败的记录会被重新回答，不留下同一个问题的重复/冲突记录)
+    返回已完成问题的 id 集合
+    """
+    if not os.path.exists(output_path):
+        return set()
+    finished = []
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 上次中断时写了一半的行
+            if record.get("answer") is not None and not record.get("error"):
+                finished.append(record)
+    # 同一个 id 只保留最后一条
+    finished = list({json.dumps(r["id"]): r for r in finished}.values())
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in finished:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+    return {json.dumps(r["id"]) for r in finished}
+
+
+def run_bulk_qa(questions, db_paths, output_path, embedding_model=None, k=20, top_k=10,
+                max_concurrency=4, rerank_batch_size=256, generate_fn=generate_answer, resume=True):
+    """
+    批量问答主流程
+    :param questions: [{"id": ..., "question": ...}, ...]
+    :param db_paths: {索引名: 索引目录}，多个索引的检索结果会合并后统一重排
+    :param output_path: 结果 JSONL，每完成一个问题追加一行 (中途中断也能保留已完成的结果)
+    :param resume: True 时跳过 output_path 中已成功回答的问题 (按 id)；False 时清空结果文件从头开始
+    :param max_concurrency: 同时进行的 LLM 生成数
+    :return: 统计信息 (各阶段耗时、成功/失败数、每分钟问题数)
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if resume:
+        finished = load_finished(output_path)
+        skipped = len(questions)
+        questions = [q for q in questions if json.dumps(q["id"]) not in finished]
+        skipped -= len(questions)
+        if skipped:
+            print(f"⏭️ [BulkQA] 跳过 {skipped} 个已完成的问题")
+    else:
+        open(output_path, "w", encoding="utf-8").close()
+
+    stats = {"questions": len(questions), "succeeded": 0, "failed": 0}
+    if not questions:
+        print("⚠️ [BulkQA] 没有需要回答的问题")
+        return {**stats, "elapsed": 0.0, "questions_per_minute": 0.0, "timings": {}}
+    if embedding_model is None:
+        from src.rag.embedding_client import get_embedding_client
+        embedding_model = get_embedding_client()
+    start = time.perf_counter()
+    timings = {}
+
+    # Step 1: 每个索引只加载一次 (多个名字指向同一目录时只检索一次，避免候选重复)
+    unique_paths = {}
+    for name, path in db_paths.items():
+        unique_paths.setdefault(os.path.realpath(path), name)
+    vectorstores = {name: load_vectorstore(path, embedding_model) for path, name in unique_paths.items()}
+    timings["load"] = time.perf_counter() - start
+
+    # Step 2: 分批向量化所有问题
+    t = time.perf_counter()
+    query_vectors = embed_questions(questions, embedding_model)
+    timings["embed"] = time.perf_counter() - t
+
+    # Step 3: 每个索引一次批量检索，多个索引按距离合并后取前 k 个
+    t = time.perf_counter()
+    candidates = [[] for _ in questions]
+    for name, vectorstore in vectorstores.items():
+        for merged, hits in zip(candidates, batch_search(vectorstore, name, query_vectors, k)):
+            merged.extend(hits)
+    candidates = [[doc for _, doc in sorted(hits, key=lambda x: x[0])[:k]] for hits in candidates]
+    timings["search"] = time.perf_counter() - t
+
+    # Step 4: 共享批次重排序
+    t = time.perf_counter()
+    reranked, rerank_errors = rerank_batch(questions, candidates, top_k=top_k, batch_size=rerank_batch_size)
+    final_docs = [normalize_page_numbers(docs) for docs in reranked]
+    timings["rerank"] = time.perf_counter() - t
+
+    # Step 5: 并发生成，完成一个写一个
+    t = time.perf_counter()
+    write_lock = threading.Lock()
+
+    def answer(question, docs, rerank_error):
+        record = {
+            "id": question["id"],
+            "question": question["question"],
+            "answer": None,
+            "sources": [{"index": d.metadata["index"], "page": d.metadata["human_page_number"],
+                         "content": d.page_content} for d in docs],
+            "error": rerank_error,
+        }
+        if rerank_error is None:
+            try:
+                record["answer"] = generate_fn(build_messages(question["question"], docs))
+            except Exception as e:
+                record["error"] = str(e)
+        with write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            stats["failed" if record["error"] else "succeeded"] += 1
+            done = stats["succeeded"] + stats["failed"]
+            if done % 10 == 0 or done == len(questions):
+                print(f"⏳ [BulkQA] {done}/{len(questions)}")
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(answer, q, docs, error)
+                   for q, docs, error in zip(questions, final_docs, rerank_errors)]
+        for future in as_completed(futures):
+            future.result()
+    timings["generate"] = time.perf_counter() - t
+
+    elapsed = time.perf_counter() - start
+    stats.update({
+        "elapsed": elapsed,
+        "questions_per_minute": len(questions) / elapsed * 60 if elapsed else 0.0,
+        "timings": timings,
+    })
+    print(f"✅ [BulkQA] {len(questions)} 个问题 x {len(vectorstores)} 个索引，耗时 {elapsed:.1f}s，"
+          f"{stats['questions_per_minute']:.1f} 题/分钟 (失败 {stats['failed']})")
+    print("   " + " | ".join(f"{name} {sec:.2f}s" for name, sec in timings.items()))
+    return stats
+
+
+def main():
+    from src.ingest.dedup import DedupLibrary
+
+    parser = argparse.ArgumentParser(description="批量问答")
+    parser.add_argument("questions", help="问题文件：.txt 每行一个问题，或 .jsonl (id, question)")
+    parser.add_argument("--index", action="append", required=True, help="索引名 (data/vector_dbs 下)，可重复")
+    parser.add_argument("--db-dir", default=DB_DATA_DIR)
+    parser.add_argument("--output", default=os.path.join("data", "bulk_qa", "results.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的 LLM 生成数")
+    parser.add_argument("--k", type=int, default=20, help="每个问题的检索候选数")
+    parser.add_argument("--top-k", type=int, default=10, help="重排后保留的文档数")
+    parser.add_argument("--rerank-batch", type=int, default=256)
+    parser.add_argument("--restart", action="store_true", help="清空结果文件从头开始 (默认跳过已完成的问题)")
+    args = parser.parse_args()
+
+    # 重复上传的文档名解析到实际索引
+    library = DedupLibrary()
+    db_paths = {name: os.path.join(args.db_dir, library.resolve(name)) for name in args.index}
+    questions = load_questions(args.questions)
+    run_bulk_qa(questions, db_paths, args.output, k=args.k, top_k=args.top_k,
+                max_concurrency=args.concurrency, rerank_batch_size=args.rerank_batch, resume=not args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,15 @@
-import dashscope
 import os
-import contextlib
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-
-# --- 0. 辅助工具 ---
-@contextlib.contextmanager
-def temporary_chdir(path):
-    old_cwd = os.getcwd()
-    os.chdir(path)
-    try: yield
-    finally: os.chdir(old_cwd)
+from src.utils.loaders import load_dashscope
+from src.rag.reranker import rerank_documents
+from src.rag.vector_storage import load_faiss_index
 
 # --- 1. Rerank ---
-try:
-    from src.rag.reranker import get_reranker
-    def rerank_documents(query, docs, top_k=3):
-        if not docs: return []
-        reranker = get_reranker()
-        pairs = [[query, d.page_content] for d in docs]
-        scores = reranker.compute_score(pairs)
-        if isinstance(scores, float): scores = [scores]
-        doc_score_pairs = list(zip(docs, scores))
-        doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
-        return [doc for doc, score in doc_score_pairs[:top_k]]
-except ImportError:
-    def rerank_documents(query, docs, top_k=3):
-        return docs[:top_k]
+# rerank_documents 来自 src.rag.reranker (支持量化后端与跨请求合批)
 
 # --- 2. API 配置 ---
+# dashscope 在第一次调用时由 load_dashscope() 导入并设置 api_key
 load_dotenv()
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 
 # --- 3. 查询改写 ---
 def rewrite_query(user_query, chat_history):
@@ -40,33 +19,29 @@ def rewrite_query(user_query, chat_history):
     prompt = f"任务：改写提问，补全指代词。\n历史：{history_text}\n提问：{user_query}\n结果："
     try:
         # 改写不需要太严谨，temperature 保持默认即可
+        dashscope = load_dashscope()
         res = dashscope.Generation.call(model='qwen-turbo', messages=[{'role':'user','content':prompt}], result_format='message')
         if res.status_code == 200: return res.output.choices[0].message.content.strip()
     except: pass
     return user_query
 
-# --- 4. 核心主流程 ---
-def get_answer_stream(query, db_path, chat_history=[], embedding_model=None):
-    if embedding_model is None: raise ValueError("需要 embedding_model")
+# --- 4. 各步骤 (供 get_answer_stream 与独立查询服务复用) ---
+def load_vectorstore(db_path, embedding_model=None):
+    if embedding_model is None:
+        from src.rag.embedding_client import get_embedding_client
+        embedding_model = get_embedding_client()
     if not os.path.exists(db_path): raise FileNotFoundError(f"找不到索引: {db_path}")
+    # 不切换工作目录，多个线程可以同时加载不同的索引
+    return load_faiss_index(db_path, embedding_model)
 
-    # Step 1: 改写
-    search_query = rewrite_query(query, chat_history)
-    
-    # Step 2: 加载 FAISS
-    try:
-        with temporary_chdir(db_path):
-            vectorstore = FAISS.load_local(".", embedding_model, allow_dangerous_deserialization=True)
-    except:
-        vectorstore = FAISS.load_local(db_path, embedding_model, allow_dangerous_deserialization=True)
+def retrieve_documents(search_query, vectorstore, k=20, top_k=10):
+    # 检索 + Rerank
+    retrieved_docs = vectorstore.similarity_search(search_query, k=k)
+    final_docs = rerank_documents(search_query, retrieved_docs, top_k=top_k)
+    return normalize_page_numbers(final_docs)
 
-    # Step 3: 检索
-    retrieved_docs = vectorstore.similarity_search(search_query, k=20)
-
-    # Step 4: Rerank
-    final_docs = rerank_documents(search_query, retrieved_docs, top_k=10)
-    
-    # Step 5: 构建上下文
+def normalize_page_numbers(final_docs):
+    # 规范化页码
     for doc in final_docs:
         raw_page = doc.metadata.get('source_page') or doc.metadata.get('page_number') or 1
         try:
@@ -76,7 +51,9 @@ def get_answer_stream(query, db_path, chat_history=[], embedding_model=None):
             doc.metadata['human_page_number'] = 1
 
     final_docs.sort(key=lambda x: x.metadata['human_page_number'])
+    return final_docs
 
+def build_messages(query, final_docs):
     context_list = []
     for doc in final_docs:
         p = doc.metadata['human_page_number']
@@ -99,13 +76,15 @@ def get_answer_stream(query, db_path, chat_history=[], embedding_model=None):
 {context_str}
 """
 
-    messages = [
+    return [
         {'role': 'system', 'content': system_prompt},
         {'role': 'user', 'content': query}
     ]
 
+def generate_stream(messages):
     # 🔥 核心修改：添加 temperature 参数
-    responses = dashscope.Generation.call(
+    dashscope = load_dashscope()
+    return dashscope.Generation.call(
         model='qwen-turbo',
         messages=messages,
         result_format='message',
@@ -114,5 +93,37 @@ def get_answer_stream(query, db_path, chat_history=[], embedding_model=None):
         temperature=0.01,  # 👈 关键！设为极低值，接近 0
         top_p=0.8          # 辅助参数，限制过度发散
     )
+
+def generate_answer(messages):
+    # 非流式生成，供批量问答使用 (参数与 generate_stream 保持一致)
+    dashscope = load_dashscope()
+    res = dashscope.Generation.call(
+        model='qwen-turbo',
+        messages=messages,
+        result_format='message',
+        temperature=0.01,
+        top_p=0.8
+    )
+    if res.status_code != 200:
+        raise RuntimeError(f"生成失败: {res.code} {res.message}")
+    return res.output.choices[0].message.content
+
+# --- 5. 核心主流程 ---
+def get_answer_stream(query, db_path, chat_history=[], embedding_model=None):
+    if not os.path.exists(db_path): raise FileNotFoundError(f"找不到索引: {db_path}")
+
+    # Step 1: 改写
+    search_query = rewrite_query(query, chat_history)
+    
+    # Step 2: 加载 FAISS
+    vectorstore = load_vectorstore(db_path, embedding_model)
+
+    # Step 3-4: 检索 + Rerank
+    final_docs = retrieve_documents(search_query, vectorstore)
+    
+    # Step 5-6: 构建上下文与 Prompt
+    messages = build_messages(query, final_docs)
+
+    responses = generate_stream(messages)
     
     return responses, final_docs
\ No newline at end of file
@@ -1,12 +1,7 @@
 import re
-import fitz  # PyMuPDF
-import numpy as np
-import cv2
-import logging
-from paddleocr import PaddleOCR
-
-# 屏蔽 PaddleOCR 的调试日志，保持控制台整洁
-logging.getLogger("ppocr").setLevel(logging.WARNING)
+import contextlib
+# fitz / numpy / cv2 / PaddleOCR 都在第一次用到时才加载，只聊天不解析的用户不需要它们
+from src.utils.loaders import load_fitz, load_numpy, load_cv2, load_paddleocr
 
 def is_text_garbled_or_empty(text, min_length=15):
     """
@@ -79,6 +74,7 @@ def ocr_page_image(page, ocr_engine):
     将页面转为图片并进行 OCR
     """
     print("   [OCR] 启动视觉识别中...")
+    fitz, np, cv2 = load_fitz(), load_numpy(), load_cv2()
     
     # 渲染高分辨率图片 (zoom=2 保证清晰度)
     zoom = 2
@@ -108,14 +104,19 @@ def ocr_page_image(page, ocr_engine):
             
     return ocr_text
 
-def smart_extract(pdf_path, ocr_engine):
+def smart_extract(pdf_path, ocr_engine, progress_callback=None, ocr_lock=None, page_dedup=None):
     """
     主解析逻辑：
     1. 尝试直接提取 -> 失败则 OCR
     2. 页眉页脚清洗 (保留摘要)
     3. 参考文献截断 (防止语义污染)
+
+    :param progress_callback: 可选，每处理完一页调用 progress_callback(已处理页数, 总页数)；
+                              回调内抛出异常即可中断解析 (用于后台任务取消)
+    :param ocr_lock: 可选，OCR 时持有的锁/信号量，用于限制并发 OCR 的数量
+    :param page_dedup: 可选，src.ingest.dedup.PageDeduper；命中重复/近似重复页时直接复用之前的解析结果
     """
-    doc = fitz.open(pdf_path)
+    doc = load_fitz().open(pdf_path)
     full_content = []
     total_pages = len(doc)
     
@@ -128,6 +129,7 @@ def smart_extract(pdf_path, ocr_engine):
         # 0. 如果已经触发了截断机制，直接跳过剩余页面
         if stop_parsing:
             print(f"🛑 [截断] 跳过第 {page_num + 1} 页 (参考文献/附录区域)。")
+            if progress_callback: progress_callback(total_pages, total_pages)
             break
 
         # 1. 尝试直接获取文本
@@ -144,16 +146,25 @@ def smart_extract(pdf_path, ocr_engine):
             need_ocr = True
             reason = "检测到乱码或无效短文本"
         
-        # 3. 执行提取
+        # 3. 执行提取 (先查去重库，命中则跳过 OCR)
         final_text = ""
-        if need_ocr:
+        fingerprint, reused = page_dedup.lookup(page, raw_text, need_ocr) if page_dedup else (None, None)
+        if reused:
+            print(f"♻️ 第 {page_num + 1} 页: 与已 OCR 的页面相同，复用识别结果")
+            final_text = reused["content"]
+            method = reused["method"]
+        elif need_ocr:
             print(f"📄 第 {page_num + 1} 页: ⚠️ {reason}，执行 OCR...")
-            final_text = ocr_page_image(page, ocr_engine)
+            with ocr_lock or contextlib.nullcontext():
+                final_text = ocr_page_image(page, ocr_engine)
             method = "OCR"
         else:
             # print(f"📄 第 {page_num + 1} 页: ✅ 文本提取成功")
             final_text = raw_text
 
+        if page_dedup and not reused:
+            page_dedup.remember(page_num + 1, fingerprint, final_text, method)
+
         # 4. 【新增】清洗页眉页脚
         # 在处理参考文献之前先清洗，防止页眉里的关键词干扰判断
         final_text = clean_header_footer(final_text)
@@ -179,6 +190,7 @@ def smart_extract(pdf_path, ocr_engine):
                 final_text = "\n".join(cleaned_lines_for_this_page)
                 # 如果这一页截断后没剩什么内容了，就直接跳过不存
                 if not final_text.strip():
+                    if progress_callback: progress_callback(page_num + 1, total_pages)
                     continue
 
         # 6. 存入结果
@@ -189,12 +201,16 @@ def smart_extract(pdf_path, ocr_engine):
                 "method": method
             })
 
+        if progress_callback:
+            progress_callback(page_num + 1, total_pages)
+
     doc.close()
     return full_content
 
 if __name__ == "__main__":
     # 测试代码
     print("⏳ 初始化 PaddleOCR 引擎...")
+    PaddleOCR = load_paddleocr()
     engine = PaddleOCR(lang="ch", use_angle_cls=True)
 
     # 请替换为你本地的测试文件路径
@@ -0,0 +1,125 @@
+import re
+from bisect import bisect_right
+
+# 句子边界：句末标点 / 换行之后，连同紧跟的句末标点、右引号/右括号一起算作当前句的结尾
+# 英文句点只在后面跟空白、且前面不是数字时才算句末，避免切开 "3.14"、"e.g." 和列表序号 "1. xxx"
+# (首字符写成一个字符集，正则引擎可以快速跳过普通字符)
+_BOUNDARY = r"[。！？；!?;\n.](?:(?<!\.)|(?<!\d\.)(?=\s))[。！？；!?;”’」』）)\"']*"
+_FIRST_BOUNDARY_RE = re.compile(_BOUNDARY)
+_SPACE_RE = re.compile(r"\s*")
+# 贪婪的 .* 先吃到窗口末尾再回溯，一次 match 就在 C 里反向找到窗口内最后一个边界
+_LAST_BOUNDARY_RE = re.compile(r"(?s:.*)" + _BOUNDARY)
+
+# 标题行：第X章/节、"一、"、"1 引言"、"1.2 方法"、Markdown 标题
+# 只在行首 (换行之后) 匹配；整行 (去掉首尾空白) 不超过 40 字、不含句末标点、不以逗号结尾
+# 以换行字面量开头，正则引擎可以直接跳到换行处再尝试匹配，扫描整段文本的开销很小
+_HEADING_RE = re.compile(
+    r"\n[ \t]*"
+    r"(?=第[一二三四五六七八九十百零\d]+[章节部分篇]"
+    r"|[一二三四五六七八九十]+、"
+    r"|\d+(?:\.\d+)*[ \t]+\S"
+    r"|#{1,6}[ \t])"
+    r"(?:[^\n。！？；!?;.]|\.(?!\s)){0,39}[^\s。！？；!?;.，,]"
+    r"[ \t]*(?=\n|$)"
+)
+
+
+def _last_boundary(text, lo, hi):
+    """(lo, hi] 内最后一个句子边界 (句末标点/换行之后的位置)，没有则返回 -1"""
+    # 多看一个字符，让窗口末尾的英文句点能判断后面是不是空白
+    m = _LAST_BOUNDARY_RE.match(text, lo, hi + 1)
+    if m and m.end() > hi:
+        m = _LAST_BOUNDARY_RE.match(text, lo, hi)
+    return m.end() if m else -1
+
+
+def _first_boundary(text, lo, hi):
+    """(lo, hi] 内第一个句子边界，没有则返回 -1"""
+    m = _FIRST_BOUNDARY_RE.search(text, lo, hi + 1)
+    return m.end() if m and m.end() <= hi else -1
+
+
+def chunk_text(text, chunk_size=500, chunk_overlap=50):
+    """
+    单遍扫描的中文感知切分器，返回每个切片在原文中的 (char_start, char_end)
+
+    1. 一个正则扫描全文，找出所有标题行的起点
+    2. 每个切片在 [起点, 起点 + chunk_size] 窗口内反向查找最后一个句子边界 (。！？； 和换行)
+    3. 切片内遇到标题强制在标题前结束 (不跨章节重叠)；列表项都在行首，换行本身就是边界
+    4. 新切片从上一个切片末尾 chunk_overlap 个字符内的第一个句子边界继续，保证重叠落在句子边界上
+    5. 窗口内没有任何句子边界 (超长片段) 时按固定窗口硬切
+
+    不为每个句子执行 Python 代码：每个切片只做两次正则 match/search 和一次二分查找，
+    每个字符只被扫描常数次，整体是线性时间。
+    text[char_start:char_end] 与切片内容完全一致，可以直接用于原文高亮。
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap 必须小于 chunk_size")
+
+    heading_starts = [m.start() + 1 for m in _HEADING_RE.finditer(text)]
+    n = len(text)
+    step = chunk_size - chunk_overlap
+    spans = []
+    pos = 0
+    prev_end = 0
+
+    while True:
+        # 切片不以空白开头，chunk_size 从第一个非空白字符算起
+        pos = _SPACE_RE.match(text, pos).end()
+        if pos >= n:
+            break
+        limit = pos + chunk_size
+        end = n if limit >= n else _last_boundary(text, pos, limit)
+
+        if end <= pos:
+            # 超长片段：按窗口硬切，剩余部分照常继续装句子
+            stop, next_pos = limit, pos + step
+        elif pos < prev_end and (end <= prev_end or not text[prev_end:end].strip()):
+            # 重叠部分之后的下一句装不下：放弃重叠，从上一个切片末尾重新开始
+            pos = prev_end
+            continue
+        else:
+            stop = end
+            h = bisect_right(heading_starts, pos)
+            h = heading_starts[h] if h < len(heading_starts) else n + 1
+            if h <= end:
+                # 切片内有标题：在标题前结束，下一个切片从标题开始，不做重叠
+                stop = next_pos = h
+            elif h - end <= chunk_size and not text[end:h].strip():
+                # 紧跟着就是标题 (中间只有空行)：同样不做重叠
+                next_pos = h
+            elif end >= n:
+                next_pos = n
+            else:
+                # 在句子边界上回退出重叠部分
+                next_pos = _first_boundary(text, max(pos, end - chunk_overlap - 1), end - 1)
+                if next_pos <= pos or next_pos >= end:
+                    next_pos = end
+            prev_end = stop
+
+        # 去掉末尾空白 (每个切片只做一次)
+        piece = text[pos:stop].rstrip()
+        if piece:
+            spans.append((pos, pos + len(piece)))
+        pos = next_pos
+
+    return spans
+
+
+def split_documents(documents, chunk_size=500, chunk_overlap=50):
+    """
+    切分 LangChain Document 列表，替代 RecursiveCharacterTextSplitter
+    每个切片的 metadata 会在原有字段 (source_page 等) 基础上补充：
+        char_start / char_end : 切片在该页文本中的字符偏移
+        chunk_index           : 切片在该页内的序号
+    """
+    split_docs = []
+    for doc in documents:
+        text = doc.page_content
+        for idx, (start, end) in enumerate(chunk_text(text, chunk_size, chunk_overlap)):
+            meta = dict(doc.metadata)
+            meta["char_start"] = start
+            meta["char_end"] = end
+            meta["chunk_index"] = idx
+            split_docs.append(type(doc)(page_content=text[start:end], metadata=meta))
+    return split_docs
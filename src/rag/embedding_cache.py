@@ -0,0 +1,67 @@
+import os
+import array
+import sqlite3
+import hashlib
+import threading
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = os.path.join("data", "embedding_cache.sqlite")
+
+# SQLite 单条语句的参数个数有上限，分批查询
+_QUERY_CHUNK = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带持久化缓存的 Embeddings 包装：按 (模型, 文本) 的哈希缓存向量
+    重复文档 / 近似重复页复用解析结果后，切片文本完全相同，向量直接从缓存读取，不再调用接口
+    stats 记录命中 (省下的向量化次数) 和实际计算的条数
+    """
+
+    def __init__(self, embeddings, path=EMBEDDING_CACHE_PATH, model_name=None):
+        self.embeddings = embeddings
+        self.path = path
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with sqlite3.connect(path, timeout=30) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [self._key(t) for t in texts]
+        cached = {}
+        with sqlite3.connect(self.path, timeout=30) as conn:
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[i:i + _QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, blob in rows:
+                    cached[key] = array.array("f", blob).tolist()
+
+        # 只对未命中的文本 (去重后) 调用底层接口
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_rows = []
+            for key, vector in zip(missing, vectors):
+                cached[key] = list(vector)
+                new_rows.append((key, array.array("f", vector).tobytes()))
+            with sqlite3.connect(self.path, timeout=30) as conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", new_rows)
+
+        with self._lock:
+            self.stats["misses"] += len(missing)
+            self.stats["hits"] += len(texts) - len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.embeddings import Embeddings
+
+DASHSCOPE_EMBEDDING_URL = "https://dashscope.aliyuncs.com/api/v1/services/embeddings/text-embedding/text-embedding"
+
+# text-embedding-v1 单次请求最多 25 条文本
+DEFAULT_BATCH_SIZE = 25
+
+# 可重试的 HTTP 状态码：限流 + 服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    令牌桶限流器：每秒补充 rate 个令牌，最多攒 capacity 个
+    acquire() 在令牌不足时阻塞等待，线程安全
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingError(RuntimeError):
+    """Embedding 接口调用失败 (已用尽重试次数或不可重试的错误)"""
+
+
+class EmbeddingClient(Embeddings):
+    """
+    长生命周期的 DashScope Embedding 客户端，替代每次新建 DashScopeEmbeddings
+    - requests.Session 连接池复用 TCP/TLS 连接
+    - 按 batch_size 分批，最多 max_concurrency 个批次并发请求
+    - 令牌桶限制每秒请求数，429/5xx/网络错误指数退避重试
+    实现了 LangChain Embeddings 接口，可直接传给 FAISS
+    """
+
+    def __init__(self, model="text-embedding-v1", api_key=None, base_url=DASHSCOPE_EMBEDDING_URL,
+                 batch_size=DEFAULT_BATCH_SIZE, max_concurrency=4, requests_per_second=10,
+                 max_retries=5, backoff_base=0.5, backoff_max=8.0, timeout=30):
+        self.model = model
+        self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self._bucket = TokenBucket(requests_per_second)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "retries": 0}
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    def _post_batch(self, texts, text_type):
+        payload = {
+            "model": self.model,
+            "input": {"texts": texts},
+            "parameters": {"text_type": text_type},
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            self._count("requests")
+            retry_after = None
+            try:
+                resp = self._session.post(self.base_url, json=payload, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"网络错误: {e}"
+            else:
+                if resp.status_code == 200:
+                    embeddings = resp.json()["output"]["embeddings"]
+                    embeddings.sort(key=lambda e: e["text_index"])
+                    self._count("texts", len(texts))
+                    return [e["embedding"] for e in embeddings]
+                error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+                if resp.status_code not in RETRYABLE_STATUS:
+                    raise EmbeddingError(error)
+                retry_after = resp.headers.get("Retry-After")
+
+            if attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._backoff(attempt, retry_after))
+
+        raise EmbeddingError(f"重试 {self.max_retries} 次后仍失败，{error}")
+
+    def _embed(self, texts, text_type):
+        texts = [t if t.strip() else " " for t in texts]
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._post_batch(batches[0], text_type)
+        vectors = []
+        for batch_vectors in self._executor.map(lambda b: self._post_batch(b, text_type), batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._embed(list(texts), "document")
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts):
+        """批量向量化多个问题 (text_type=query)，供批量问答使用"""
+        if not texts:
+            return []
+        return self._embed(list(texts), "query")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # fork 出来的子进程不能继承父进程的连接池 (会和父进程共用同一条 TLS 连接) 和线程池，丢弃后按需重建
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_embedding_client():
+    """
+    进程内共享的 EmbeddingClient 单例 (fork 后的子进程会重新创建自己的实例)
+    并发数和限流可以通过环境变量 EMBEDDING_MAX_CONCURRENCY / EMBEDDING_RPS 调整
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = EmbeddingClient(
+                    max_concurrency=int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")),
+                    requests_per_second=float(os.getenv("EMBEDDING_RPS", "10")),
+                )
+    return _client
@@ -0,0 +1,83 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    跨请求的微批调度器：把并发请求提交的 (query, passage) 对合并成一个批次，做一次前向计算
+
+    - 第一个请求到达后最多再等 max_wait_ms，期间到达的请求都并入同一批
+    - 凑够 max_batch_size 个 pair 时立即执行，不再等待
+    - 只有一个后台线程调用 score_fn，模型不会被多个线程同时使用
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=5):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.stats = {"batches": 0, "pairs": 0, "requests": 0}
+        self._thread = threading.Thread(target=self._loop, name="rerank-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, pairs):
+        future = Future()
+        if not pairs:
+            future.set_result([])
+        else:
+            self._queue.put((list(pairs), future))
+        return future
+
+    def score(self, pairs):
+        return self.submit(pairs).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            all_pairs = [pair for pairs, _ in batch for pair in pairs]
+            try:
+                scores = self.score_fn(all_pairs)
+                if isinstance(scores, float):
+                    scores = [scores]
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # 合并后的批次失败：逐个请求单独重算，一个坏请求不拖累同批的其他请求
+                    for pairs, future in batch:
+                        self._score_alone(pairs, future)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["pairs"] += len(all_pairs)
+            self.stats["requests"] += len(batch)
+            offset = 0
+            for pairs, future in batch:
+                future.set_result(list(scores[offset:offset + len(pairs)]))
+                offset += len(pairs)
+
+    def _score_alone(self, pairs, future):
+        try:
+            scores = self.score_fn(pairs)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        future.set_result([scores] if isinstance(scores, float) else list(scores))
@@ -1,15 +1,123 @@
-import streamlit as st
-from FlagEmbedding import FlagReranker
+import os
+import threading
+from src.utils.loaders import load_flag_reranker, load_torch, load_transformers
+from src.rag.micro_batcher import MicroBatcher
 
-# 使用 st.cache_resource 确保模型只加载一次，极大提升速度
-@st.cache_resource
+# Reranker 配置 (环境变量)：
+#   RERANKER_BACKEND        flag (默认，FlagEmbedding) / int8 (CPU 上的 int8 动态量化模型)
+#   RERANKER_MODEL          模型名或本地路径
+#   RERANKER_MAX_LENGTH     (问题, 文档) 拼接后的最大 token 数，超出部分截断文档
+#   RERANKER_BATCH_WAIT_MS  跨请求合批的最长等待时间，设为 0 关闭合批
+#   RERANKER_MAX_BATCH      单个合批的最大 pair 数
+DEFAULT_MODEL = 'BAAI/bge-reranker-base'
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+class Int8CpuReranker:
+    """
+    纯 CPU 服务器用的 Reranker 后端：Linear 层做 int8 动态量化
+    (use_fp16 在 CPU 上不起作用，int8 才能真正减少计算量和内存)
+    compute_score 与 FlagReranker 接口一致
+    """
+
+    def __init__(self, model_name_or_path=DEFAULT_MODEL, max_length=512, batch_size=32):
+        torch = load_torch()
+        transformers = load_transformers()
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(model_name_or_path)
+        model = transformers.AutoModelForSequenceClassification.from_pretrained(model_name_or_path)
+        model.eval()
+        self.model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def compute_score(self, sentence_pairs):
+        torch = load_torch()
+        # 按文档长度排序后再分批，减少 padding
+        order = sorted(range(len(sentence_pairs)), key=lambda i: len(sentence_pairs[i][1]))
+        scores = [0.0] * len(sentence_pairs)
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                idx = order[start:start + self.batch_size]
+                inputs = self.tokenizer(
+                    [sentence_pairs[i][0] for i in idx],
+                    [sentence_pairs[i][1] for i in idx],
+                    padding=True,
+                    # 通常只截断更长的文档；问题本身超过 max_length 时也会截断问题，而不是报错
+                    truncation="longest_first",
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                logits = self.model(**inputs).logits.view(-1).float().tolist()
+                for i, s in zip(idx, logits):
+                    scores[i] = s
+        return scores
+
+
+class LockedReranker:
+    """
+    用锁串行化 compute_score：FlagReranker 的 tokenizer 不是线程安全的，
+    多个线程同时调用会报 "RuntimeError: Already borrowed"
+    (关闭合批 RERANKER_BATCH_WAIT_MS=0 时，各请求线程会直接调用模型)
+    """
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self._lock = threading.Lock()
+
+    def compute_score(self, sentence_pairs):
+        with self._lock:
+            return self.scorer.compute_score(sentence_pairs)
+
+
+class BatchedReranker:
+    """把 compute_score 请求交给共享的 MicroBatcher，与并发请求合并成一次前向计算"""
+
+    def __init__(self, scorer, max_batch_size=64, max_wait_ms=5):
+        self.scorer = scorer
+        self.batcher = MicroBatcher(scorer.compute_score, max_batch_size=max_batch_size,
+                                    max_wait_ms=max_wait_ms)
+
+    def compute_score(self, sentence_pairs):
+        return self.batcher.score(sentence_pairs)
+
+
+def load_reranker_backend(backend=None, model_name_or_path=None, max_length=None):
+    """
+    按配置加载不带合批的 Reranker 后端
+    """
+    backend = backend or os.getenv("RERANKER_BACKEND", "flag")
+    model_name_or_path = model_name_or_path or os.getenv("RERANKER_MODEL", DEFAULT_MODEL)
+    max_length = max_length or int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+
+    if backend == "int8":
+        return Int8CpuReranker(model_name_or_path, max_length=max_length)
+    if backend == "flag":
+        FlagReranker = load_flag_reranker()
+        # use_fp16=True 在显卡上能加速，CPU上会自动回退
+        return FlagReranker(model_name_or_path, use_fp16=True, max_length=max_length)
+    raise ValueError(f"未知的 RERANKER_BACKEND: {backend}")
+
+
+# 进程内单例 + 加锁，确保模型只加载一次，极大提升速度
+# (不依赖 st.cache_resource，Streamlit 和独立的查询服务都能共享同一个实例)
 def get_reranker():
     """
-    加载 BAAI/bge-reranker-base 模型
+    加载 Reranker (默认 BAAI/bge-reranker-base)
     第一次运行时会自动下载约 1GB 的模型文件
     """
-    # use_fp16=True 在显卡上能加速，CPU上会自动回退
-    return FlagReranker('BAAI/bge-reranker-base', use_fp16=True)
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                scorer = LockedReranker(load_reranker_backend())
+                wait_ms = float(os.getenv("RERANKER_BATCH_WAIT_MS", "5"))
+                if wait_ms > 0:
+                    scorer = BatchedReranker(scorer, max_batch_size=int(os.getenv("RERANKER_MAX_BATCH", "64")),
+                                             max_wait_ms=wait_ms)
+                _reranker = scorer
+    return _reranker
 
 def rerank_documents(query, docs, top_k=3):
     """
@@ -21,27 +129,31 @@ def rerank_documents(query, docs, top_k=3):
     if not docs:
         return []
 
-    reranker = get_reranker()
-    
+    # 模型在第一次调用时才加载；未安装 FlagEmbedding / transformers 时退化为不重排
+    try:
+        reranker = get_reranker()
+    except ImportError:
+        return docs[:top_k]
+
     # 构造配对数据 [['问题', '文档内容'], ...]
     pairs = [[query, d.page_content] for d in docs]
-    
+
     # 计算相关性得分
     scores = reranker.compute_score(pairs)
-    
+
     # 将文档和分数打包
     # 如果只有1个文档，scores可能是一个float而不是list，做个兼容
     if isinstance(scores, float):
         scores = [scores]
-        
+
     doc_score_pairs = list(zip(docs, scores))
-    
+
     # 按分数从高到低排序
     doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
-    
+
     # 调试打印（可选）
     # for d, s in doc_score_pairs:
     #     print(f"Score: {s:.4f} | Content: {d.page_content[:20]}...")
 
     # 返回前 k 个文档
-    return [doc for doc, score in doc_score_pairs[:top_k]]
\ No newline at end of file
+    return [doc for doc, score in doc_score_pairs[:top_k]]
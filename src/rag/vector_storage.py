@@ -1,30 +1,48 @@
 import os
 import shutil
+import pickle
 import time
-import contextlib
-from langchain.schema import Document 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from src.rag.chunker import split_documents
+from src.utils.loaders import load_document_class, load_faiss, load_faiss_store, load_numpy
+
+DB_DATA_DIR = os.path.join("data", "vector_dbs")
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
 
-@contextlib.contextmanager
-def temporary_chdir(path):
-    """
-    上下文管理器：临时切换工作目录
-    用于解决 FAISS C++ 层无法处理中文绝对路径的 Bug
-    """
-    old_cwd = os.getcwd()
-    os.chdir(path)
-    try:
-        yield
-    finally:
-        os.chdir(old_cwd)
 
-def build_vector_db(docs, db_name, embedding_model):
+# FAISS 的 C++ 层 (write_index / read_index) 无法处理中文路径。
+# 原来的做法是临时 os.chdir 到索引目录再用相对路径读写，但 chdir 改的是整个进程的工作目录，
+# 查询服务里多个线程同时加载索引时会互相踩踏。
+# 这里改为由 Python 读写文件，FAISS 只负责内存里的序列化，文件格式与 save_local / load_local 相同。
+def save_faiss_index(vectorstore, target_dir):
+    faiss = load_faiss()
+    os.makedirs(target_dir, exist_ok=True)
+    with open(os.path.join(target_dir, INDEX_FILE), "wb") as f:
+        f.write(faiss.serialize_index(vectorstore.index).tobytes())
+    with open(os.path.join(target_dir, DOCSTORE_FILE), "wb") as f:
+        pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+
+
+def load_faiss_index(db_path, embedding_model):
+    faiss, np, FAISS = load_faiss(), load_numpy(), load_faiss_store()
+    with open(os.path.join(db_path, INDEX_FILE), "rb") as f:
+        index = faiss.deserialize_index(np.frombuffer(f.read(), dtype=np.uint8))
+    with open(os.path.join(db_path, DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embedding_model, index, docstore, index_to_docstore_id)
+
+def build_vector_db(docs, db_name, embedding_model=None, db_dir=DB_DATA_DIR):
     """
     使用 FAISS 构建向量索引 (修复：正确读取 smart_parser 的元数据)
+    embedding_model 为空时使用进程内共享的 EmbeddingClient (分批并发 + 限流重试)
+    索引保存在 db_dir/db_name 下
     """
-    base_path = r"D:\workspace\finale_workspace\PDF_RAG_Project\data\vector_dbs"
-    target_dir = os.path.join(base_path, db_name)
+    if embedding_model is None:
+        from src.rag.embedding_client import get_embedding_client
+        embedding_model = get_embedding_client()
+    Document = load_document_class()
+    FAISS = load_faiss_store()
+    target_dir = os.path.join(db_dir, db_name)
     
     # --- 1. 数据清洗与元数据提取 ---
     doc_objects = []
@@ -77,11 +95,8 @@ def build_vector_db(docs, db_name, embedding_model):
             print(f"⚠️ 清理旧文件失败: {e}")
 
     # --- 3. 切分文档 ---
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500, 
-        chunk_overlap=50
-    )
-    split_docs = text_splitter.split_documents(doc_objects)
+    # 单遍中文感知切分，metadata 中保留 char_start / char_end 供原文高亮
+    split_docs = split_documents(doc_objects, chunk_size=500, chunk_overlap=50)
     
     print(f"📄 文档切分完成: {len(doc_objects)} 页 -> {len(split_docs)} 个切片")
     
@@ -99,12 +114,8 @@ def build_vector_db(docs, db_name, embedding_model):
             embedding=embedding_model
         )
         
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-        
         print(f"💾 正在保存索引到: {target_dir}")
-        with temporary_chdir(target_dir):
-            vectorstore.save_local(".")
+        save_faiss_index(vectorstore, target_dir)
             
         print(f"✅ [RAG] FAISS 索引保存成功！")
         
@@ -0,0 +1,478 @@
+"""
+独立的异步 RAG 查询服务 (aiohttp)，可以放在负载均衡后面，也可以给 Streamlit 以外的客户端使用
+
+启动 (在项目根目录下运行)：
+    python -m src.server.rag_server --port 8080 --max-concurrency 16 --max-queue 64
+
+接口：
+    GET    /health                    服务状态 (并发/排队数)
+    GET    /indexes                   列出索引
+    DELETE /indexes/{name}            删除索引
+    POST   /indexes/{name}/reload     丢弃缓存，下次查询时重新加载
+    POST   /ingest                    上传 PDF (multipart 字段 file，同名文件已存在时返回 409)
+                                      或 JSON {"file_name", "db_name"} 解析 raw_dir 下已有的 PDF，返回解析任务
+    GET    /jobs/{job_id}             查询解析任务
+    DELETE /jobs/{job_id}             取消解析任务
+    POST   /query                     JSON {"query", "db_name", "chat_history"}，SSE 流式返回
+                                      事件依次为 sources -> token... -> done (出错时为 error)
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+RAW_DATA_DIR = os.path.join("data", "raw")
+DB_DATA_DIR = os.path.join("data", "vector_dbs")
+
+
+class RAGBackend:
+    """
+    查询服务使用的后端，每个进程一份，所有请求共享：
+    - EmbeddingClient / Reranker 都是进程内单例
+    - 已加载的 FAISS 索引按 LRU 缓存；同一个索引的加载过程加锁，避免并发请求重复加载
+    方法都是阻塞的，由服务放到线程池里执行
+    """
+
+    def __init__(self, db_dir=DB_DATA_DIR, raw_dir=RAW_DATA_DIR, max_cached_indexes=8):
+        from src.rag.embedding_client import get_embedding_client
+
+        self.db_dir = db_dir
+        self.raw_dir = raw_dir
+        self.max_cached_indexes = max_cached_indexes
+        self.embedding_model = get_embedding_client()
+
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._ingest_service = None
+        self._dedup_library = None
+
+    def warmup(self):
+        from src.rag.reranker import get_reranker
+        get_reranker()
+
+    # ---------- 索引管理 ----------
+    def _index_path(self, name):
+        if not name or name != os.path.basename(name) or name in (".", ".."):
+            raise ValueError(f"非法的索引名: {name}")
+        return os.path.join(self.db_dir, name)
+
+    def _raw_path(self, file_name):
+        # 只接受 raw_dir 下的文件名，客户端不能让服务读取任意路径的文件
+        if not file_name or file_name != os.path.basename(file_name) or file_name in (".", ".."):
+            raise ValueError(f"非法的文件名: {file_name}")
+        if not file_name.lower().endswith(".pdf"):
+            raise ValueError("只支持 PDF 文件")
+        return os.path.join(self.raw_dir, file_name)
+
+    def list_indexes(self):
+        if not os.path.isdir(self.db_dir):
+            return []
+        with self._lock:
+            loaded = set(self._indexes)
+        return [
+            {"name": name, "loaded": name in loaded}
+            for name in sorted(os.listdir(self.db_dir))
+            if os.path.exists(os.path.join(self.db_dir, name, "index.faiss"))
+        ]
+
+    @property
+    def dedup_library(self):
+        if self._dedup_library is None:
+            from src.ingest.dedup import DedupLibrary
+            self._dedup_library = DedupLibrary()
+        return self._dedup_library
+
+    def get_index(self, name):
+        from src.llm.rag_chain import load_vectorstore
+
+        # 重复上传的文档是别名，查询时落到实际索引上
+        name = self.dedup_library.resolve(name)
+        path = self._index_path(name)
+        with self._lock:
+            if name in self._indexes:
+                self._indexes.move_to_end(name)
+                return self._indexes[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if name in self._indexes:
+                    return self._indexes[name]
+            vectorstore = load_vectorstore(path, self.embedding_model)
+            with self._lock:
+                self._indexes[name] = vectorstore
+                while len(self._indexes) > self.max_cached_indexes:
+                    self._indexes.popitem(last=False)
+        return vectorstore
+
+    def evict_index(self, name):
+        with self._lock:
+            self._indexes.pop(name, None)
+
+    def delete_index(self, name):
+        path = self._index_path(name)
+        self.evict_index(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"找不到索引: {name}")
+        shutil.rmtree(path)
+        self.dedup_library.remove(name)
+
+    # ---------- 解析任务 ----------
+    @property
+    def ingest_service(self):
+        if self._ingest_service is None:
+            from src.ingest.job_queue import IngestService
+            # 索引建在本服务的 db_dir 下，/query 才能找到
+            self._ingest_service = IngestService(db_dir=self.db_dir)
+        return self._ingest_service
+
+    def ingest(self, file_name, db_name):
+        """解析 raw_dir 下的 PDF (file_name 只能是文件名，不能带目录)"""
+        pdf_path = self._raw_path(file_name)
+        self._index_path(db_name)
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"找不到文件: {file_name}")
+        return self.ingest_service.submit(pdf_path, db_name)
+
+    def get_job(self, job_id):
+        return self.ingest_service.get(job_id)
+
+    def cancel_job(self, job_id):
+        self.ingest_service.cancel(job_id)
+        return self.ingest_service.get(job_id)
+
+    # ---------- 查询 ----------
+    def retrieve(self, query, db_name, chat_history):
+        from src.llm.rag_chain import rewrite_query, retrieve_documents
+
+        vectorstore = self.get_index(db_name)
+        search_query = rewrite_query(query, chat_history)
+        return retrieve_documents(search_query, vectorstore)
+
+    def generate(self, query, docs):
+        from src.llm.rag_chain import build_messages, generate_stream
+
+        for chunk in generate_stream(build_messages(query, docs)):
+            if chunk.status_code != 200:
+                raise RuntimeError(f"LLM 调用失败: {chunk.code} {chunk.message}")
+            yield chunk.output.choices[0].message.content
+
+
+class Overloaded(Exception):
+    """排队请求数超过上限"""
+
+
+class QueryLimiter:
+    """
+    并发上限 + 排队上限 (背压)：
+    最多 max_concurrency 个查询同时执行，多出来的排队；排队数达到 max_queue 时直接拒绝
+    """
+
+    def __init__(self, max_concurrency, max_queue):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+    async def __aenter__(self):
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.active -= 1
+        self._sem.release()
+
+
+_END = object()
+
+
+async def iterate_in_thread(iterable, executor, maxsize):
+    """
+    在线程池中消费阻塞的迭代器 (如 LLM 流)，通过有界队列转成异步迭代
+    队列满时生产线程阻塞，慢客户端的背压会一路传到上游流
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item, error=None):
+        asyncio.run_coroutine_threadsafe(queue.put((item, error)), loop).result()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            put(_END, e)
+            return
+        put(_END)
+
+    future = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        # 消费方提前退出 (如客户端断开) 时，清空队列让阻塞的生产线程尽快结束
+        while not future.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _error(status, message, **headers):
+    return web.json_response({"error": message}, status=status, headers=headers or None)
+
+
+def _doc_to_source(doc):
+    meta = doc.metadata
+    return {
+        "page": meta.get("human_page_number"),
+        "char_start": meta.get("char_start"),
+        "char_end": meta.get("char_end"),
+        "text": doc.page_content,
+    }
+
+
+async def _run(request, fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app["executor"], fn, *args)
+
+
+async def _json_body(request):
+    """读取 JSON 对象请求体；格式不对时返回 None"""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+# ================= 路由 =================
+
+async def handle_health(request):
+    limiter = request.app["limiter"]
+    return web.json_response({
+        "status": "ok",
+        "active": limiter.active,
+        "waiting": limiter.waiting,
+        "max_concurrency": limiter.max_concurrency,
+        "max_queue": limiter.max_queue,
+    })
+
+
+async def handle_list_indexes(request):
+    return web.json_response(await _run(request, request.app["backend"].list_indexes))
+
+
+async def handle_delete_index(request):
+    try:
+        await _run(request, request.app["backend"].delete_index, request.match_info["name"])
+    except ValueError as e:
+        return _error(400, str(e))
+    except FileNotFoundError as e:
+        return _error(404, str(e))
+    return web.json_response({"deleted": request.match_info["name"]})
+
+
+async def handle_reload_index(request):
+    request.app["backend"].evict_index(request.match_info["name"])
+    return web.json_response({"reloaded": request.match_info["name"]})
+
+
+async def handle_ingest(request):
+    backend = request.app["backend"]
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        field = await reader.next()
+        if field is None or field.name != "file" or not field.filename:
+            return _error(400, "需要 multipart 字段 file")
+        file_name = os.path.basename(field.filename)
+        try:
+            pdf_path = backend._raw_path(file_name)
+        except ValueError as e:
+            return _error(400, str(e))
+        os.makedirs(backend.raw_dir, exist_ok=True)
+        # 文件读写放到线程池，不阻塞事件循环；"xb" 模式不会覆盖已有文件 (已有索引或任务可能正在使用它)
+        try:
+            f = await _run(request, open, pdf_path, "xb")
+        except FileExistsError:
+            return _error(409, f"文件已存在: {file_name}")
+        try:
+            while chunk := await field.read_chunk():
+                await _run(request, f.write, chunk)
+        except BaseException:
+            await _run(request, f.close)
+            await _run(request, os.remove, pdf_path)
+            raise
+        await _run(request, f.close)
+        db_name = os.path.splitext(file_name)[0].strip()
+    else:
+        body = await _json_body(request)
+        if body is None:
+            return _error(400, "请求体必须是 JSON 对象")
+        file_name = body.get("file_name")
+        if not file_name:
+            return _error(400, "需要 file_name")
+        db_name = body.get("db_name") or os.path.splitext(os.path.basename(file_name))[0].strip()
+
+    try:
+        job = await _run(request, backend.ingest, file_name, db_name)
+    except ValueError as e:
+        return _error(400, str(e))
+    except FileNotFoundError as e:
+        return _error(404, str(e))
+    return web.json_response(job, status=202)
+
+
+async def handle_get_job(request):
+    job = await _run(request, request.app["backend"].get_job, request.match_info["job_id"])
+    if job is None:
+        return _error(404, "找不到任务")
+    return web.json_response(job)
+
+
+async def handle_cancel_job(request):
+    job = await _run(request, request.app["backend"].cancel_job, request.match_info["job_id"])
+    if job is None:
+        return _error(404, "找不到任务")
+    return web.json_response(job)
+
+
+async def handle_query(request):
+    app = request.app
+    body = await _json_body(request)
+    if body is None:
+        return _error(400, "请求体必须是 JSON 对象")
+    query = (body.get("query") or "").strip()
+    db_name = body.get("db_name")
+    chat_history = body.get("chat_history") or []
+    if not query or not db_name:
+        return _error(400, "需要 query 和 db_name")
+
+    start = time.perf_counter()
+    try:
+        async with app["limiter"]:
+            try:
+                docs = await _run(request, app["backend"].retrieve, query, db_name, chat_history)
+            except ValueError as e:
+                return _error(400, str(e))
+            except FileNotFoundError as e:
+                return _error(404, str(e))
+
+            resp = web.StreamResponse(headers={
+                "Content-Type": "text/event-stream; charset=utf-8",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            })
+            await resp.prepare(request)
+            await resp.write(_sse("sources", [_doc_to_source(d) for d in docs]))
+
+            first_token_at = None
+            try:
+                tokens = app["backend"].generate(query, docs)
+                async for token in iterate_in_thread(tokens, app["executor"], app["stream_buffer"]):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    await resp.write(_sse("token", {"text": token}))
+            except (ConnectionResetError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                await resp.write(_sse("error", {"error": str(e)}))
+            else:
+                await resp.write(_sse("done", {
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "first_token_ms": round((first_token_at - start) * 1000, 1) if first_token_at else None,
+                }))
+            await resp.write_eof()
+            return resp
+    except Overloaded:
+        return _error(503, "服务繁忙，请稍后重试", **{"Retry-After": "1"})
+
+
+async def _on_startup(app):
+    if app["warmup"]:
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(app["executor"], app["backend"].warmup)
+
+
+async def _on_cleanup(app):
+    app["executor"].shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(backend=None, max_concurrency=16, max_queue=64, stream_buffer=32, warmup=True):
+    """
+    创建 aiohttp 应用
+    :param backend: 查询后端，默认 RAGBackend；压测时可以替换为桩实现
+    :param max_concurrency: 同时执行的查询数上限
+    :param max_queue: 排队等待的查询数上限，超过时返回 503
+    :param stream_buffer: 每个流在服务端缓冲的 token 数，满了之后上游 LLM 流会被阻塞
+    """
+    app = web.Application()
+    app["backend"] = backend or RAGBackend()
+    app["limiter"] = QueryLimiter(max_concurrency, max_queue)
+    # 每个进行中的查询在生成阶段占用一个线程，外加少量线程用于索引管理等短任务
+    app["executor"] = ThreadPoolExecutor(max_workers=max_concurrency + 4, thread_name_prefix="rag")
+    app["stream_buffer"] = stream_buffer
+    app["warmup"] = warmup
+
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/indexes", handle_list_indexes)
+    app.router.add_delete("/indexes/{name}", handle_delete_index)
+    app.router.add_post("/indexes/{name}/reload", handle_reload_index)
+    app.router.add_post("/ingest", handle_ingest)
+    app.router.add_get("/jobs/{job_id}", handle_get_job)
+    app.router.add_delete("/jobs/{job_id}", handle_cancel_job)
+    app.router.add_post("/query", handle_query)
+
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 查询服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--no-warmup", action="store_true", help="不在启动时预加载 Reranker")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    app = create_app(max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                     warmup=not args.no_warmup)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
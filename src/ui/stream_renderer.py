@@ -0,0 +1,157 @@
+import time
+import queue
+import threading
+
+# Markdown 块边界：空行 (段落/列表结束) 或代码块闭合
+_BLOCK_BOUNDARIES = ("\n\n", "```\n")
+
+_END = object()
+
+
+class StreamRenderer:
+    """
+    流式回答的节流渲染器，替代 "每个 token 都 placeholder.markdown(全文)" 的写法
+
+    - 第一个 token 立即渲染，保证首屏时间
+    - 之后最多按 max_fps 的帧率刷新；遇到 Markdown 块边界时允许更早刷新 (但不超过 max_block_fps)
+    - token 先缓存在列表里，只在刷新时拼接一次，避免字符串反复拷贝
+    - 未闭合的代码块在中间帧里临时补上 ```，防止整段闪烁成代码
+    - write() 只在新 token 到达时刷新；上游停顿时要靠 flush() 把缓存的 token 画出来，
+      consume() 会在后台线程读取上游，等待超过一帧时自动 flush()
+    stats 记录每个流的渲染次数、token 数、首屏时间和总耗时
+    """
+
+    def __init__(self, placeholder, max_fps=8, max_block_fps=20, cursor="▌", clock=time.perf_counter):
+        self.placeholder = placeholder
+        self.min_interval = 1.0 / max_fps
+        self.min_block_interval = 1.0 / max_block_fps
+        self.cursor = cursor
+        self.clock = clock
+
+        self._parts = []
+        self._started_at = clock()
+        self._last_render = None
+        self._pending = False
+        self.stats = {
+            "tokens": 0,
+            "chars": 0,
+            "renders": 0,
+            "time_to_first_paint": None,
+            "elapsed": None,
+        }
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def _render(self, final=False):
+        text = "".join(self._parts)
+        if not final:
+            if text.count("```") % 2 == 1:
+                text += "\n```"
+            text += self.cursor
+        self.placeholder.markdown(text)
+
+        now = self.clock()
+        if self.stats["time_to_first_paint"] is None:
+            self.stats["time_to_first_paint"] = now - self._started_at
+        self.stats["renders"] += 1
+        self._last_render = now
+        self._pending = False
+
+    def _at_block_boundary(self, token):
+        # 边界可能被拆在两个 token 之间 (如 "\n" + "\n")，带上前一个 token 的结尾一起判断
+        tail = self._parts[-2][-3:] if len(self._parts) > 1 else ""
+        window = tail + token
+        return any(b in window for b in _BLOCK_BOUNDARIES)
+
+    def write(self, token):
+        if not token:
+            return
+        self._parts.append(token)
+        self.stats["tokens"] += 1
+        self.stats["chars"] += len(token)
+
+        if self._last_render is None:
+            self._render()
+            return
+        since_last = self.clock() - self._last_render
+        if since_last >= self.min_interval:
+            self._render()
+        elif since_last >= self.min_block_interval and self._at_block_boundary(token):
+            self._render()
+        else:
+            self._pending = True
+
+    def flush(self):
+        """有尚未画出的 token 时立即刷新 (上游停顿时调用)"""
+        if self._pending:
+            self._render()
+
+    def consume(self, stream, extract=None):
+        """
+        读取整个 token 流并渲染，返回完整文本
+        上游迭代放在后台线程里，渲染仍在调用方线程 (Streamlit 的 placeholder 只能在脚本线程里更新)；
+        超过一帧没有新 token 时把缓存的 token 刷出来，LLM 卡顿时已生成的内容不会一直停在缓存里
+        :param extract: 可选，从上游的每个元素中取出 token (返回 None 表示跳过)
+        """
+        # 有界队列：调用方停下后，后台线程最多再多读 maxsize 个元素
+        items = queue.Queue(maxsize=64)
+        stop = threading.Event()
+
+        def put(entry):
+            while not stop.is_set():
+                try:
+                    items.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def pump():
+            it = iter(stream)
+            try:
+                while not stop.is_set():
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        put((_END, None))
+                        return
+                    if not put((item, None)):
+                        return
+            except Exception as e:
+                put((_END, e))
+            finally:
+                # 调用方提前退出 (Streamlit 停止/重跑脚本、点击中止) 时关闭上游，不再继续生成
+                if stop.is_set() and hasattr(it, "close"):
+                    try:
+                        it.close()
+                    except Exception:
+                        pass
+
+        threading.Thread(target=pump, name="stream-pump", daemon=True).start()
+        try:
+            while True:
+                try:
+                    item, error = items.get(timeout=self.min_interval)
+                except queue.Empty:
+                    self.flush()
+                    continue
+                if item is _END:
+                    if error is not None:
+                        self.flush()
+                        raise error
+                    break
+                token = extract(item) if extract else item
+                if token:
+                    self.write(token)
+        finally:
+            # 任何退出路径 (正常结束、异常、Streamlit 的 StopException) 都通知后台线程停止读取
+            stop.set()
+        return self.close()
+
+    def close(self):
+        """渲染最终结果 (去掉光标)，返回完整文本"""
+        self._render(final=True)
+        self.stats["elapsed"] = self.clock() - self._started_at
+        return self.text
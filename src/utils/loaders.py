@@ -0,0 +1,114 @@
+"""
+重量级依赖的显式加载器：模块导入时不再 import 这些库，而是在第一次真正用到时才加载
+
+只和已解析的文档聊天的用户不会加载 OCR (paddleocr / cv2)；打开页面时也不会加载 torch / FlagEmbedding。
+基线和回归检查见 benchmarks/bench_startup.py
+"""
+import os
+import logging
+import threading
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def load_fitz():
+    import fitz  # PyMuPDF
+    return fitz
+
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    import numpy
+    return numpy
+
+
+@functools.lru_cache(maxsize=None)
+def load_cv2():
+    import cv2
+    return cv2
+
+
+@functools.lru_cache(maxsize=None)
+def load_paddleocr():
+    from paddleocr import PaddleOCR
+    # 屏蔽 PaddleOCR 的调试日志，保持控制台整洁
+    logging.getLogger("ppocr").setLevel(logging.WARNING)
+    return PaddleOCR
+
+
+@functools.lru_cache(maxsize=None)
+def load_flag_reranker():
+    from FlagEmbedding import FlagReranker
+    return FlagReranker
+
+
+@functools.lru_cache(maxsize=None)
+def load_torch():
+    import torch
+    return torch
+
+
+@functools.lru_cache(maxsize=None)
+def load_transformers():
+    import transformers
+    return transformers
+
+
+@functools.lru_cache(maxsize=None)
+def load_psutil():
+    import psutil
+    return psutil
+
+
+@functools.lru_cache(maxsize=None)
+def load_faiss():
+    import faiss
+    return faiss
+
+
+@functools.lru_cache(maxsize=None)
+def load_faiss_store():
+    from langchain_community.vectorstores import FAISS
+    return FAISS
+
+
+@functools.lru_cache(maxsize=None)
+def load_document_class():
+    from langchain.schema import Document
+    return Document
+
+
+@functools.lru_cache(maxsize=None)
+def load_dashscope():
+    import dashscope
+    from dotenv import load_dotenv
+    load_dotenv()
+    dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+    return dashscope
+
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def start_background_warmup(*tasks):
+    """
+    在后台守护线程里依次执行预热任务 (如加载 Reranker)，只会启动一次
+    预热失败只打印日志，不影响正常使用：真正用到时会再按需加载
+    """
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started:
+            return False
+        _warmup_started = True
+
+    def run():
+        for task in tasks:
+            try:
+                task()
+            except Exception as e:
+                print(f"⚠️ [Warmup] {getattr(task, '__name__', task)} 预热失败: {e}")
+        print("🔥 [Warmup] 后台预热完成")
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+    return True